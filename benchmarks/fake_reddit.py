@@ -0,0 +1,272 @@
+import random
+import threading
+import time
+
+from prawcore.exceptions import TooManyRequests
+
+# A local stand-in for praw.Reddit so the crawler and cleaner can be measured
+# without credentials or network access.
+#
+# It generates a deterministic universe of submissions with comment trees, serves
+# them with a configurable per-request latency, tracks a rate-limit window the way
+# Reddit's headers do (exposed as `auth.limits`, like prawcore) and can answer 429s.
+# Every simulated HTTP request is counted in `requests`.
+#
+# Only the parts of the PRAW API the crawler and cleaner use are implemented:
+#   reddit.submission(url=...), submission._fetch(), reddit.subreddit(name).top/hot/new/controversial,
+#   reddit.info(fullnames=...), submission.comments.replace_more()/list(),
+#   reddit.config.username, reddit.auth.limits
+
+_WORDS = ("the what why how reddit question answer people think would best worst ever "
+          "thing time life story really never always someone friend work school found "
+          "today years advice learned wish knew first last moment").split()
+
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def to_base36(n: int) -> str:
+    digits = ""
+    while True:
+        n, r = divmod(n, 36)
+        digits = _BASE36[r] + digits
+        if n == 0:
+            return digits
+
+
+class FakeResponse:
+    # Just enough of requests.Response for prawcore's TooManyRequests
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = ""
+
+
+class FakeConfig:
+    def __init__(self, username):
+        self.username = username
+
+
+class FakeAuth:
+    def __init__(self, reddit):
+        self._reddit = reddit
+
+    @property
+    def limits(self):
+        return self._reddit.limits()
+
+
+class FakeRedditor:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeSubredditRef:
+    def __init__(self, name):
+        self.display_name = name
+
+
+class FakeComment:
+    def __init__(self, comment_id, author, body, created_utc, score):
+        self.id = comment_id
+        self.author = author
+        self.body = body
+        self.created_utc = created_utc
+        self.score = score
+
+
+class FakeMoreComments:
+    # Placeholder for `count` comments that are not loaded yet; no `body`, like praw's.
+    def __init__(self, count):
+        self.count = count
+
+
+class FakeCommentForest:
+    def __init__(self, submission, comments, page_size):
+        self._submission = submission
+        self._pending = comments  # all comments of the thread, loaded page by page
+        self._page_size = page_size
+        self._loaded = comments[:page_size]
+        self._more = self._chunks(comments[page_size:])
+
+    def _chunks(self, rest):
+        return [FakeMoreComments(len(rest[i:i + 100])) for i in range(0, len(rest), 100)]
+
+    def replace_more(self, limit=32, threshold=0):
+        # Each MoreComments costs one request; unexpanded ones are removed (like praw).
+        replaced = 0
+        while self._more and (limit is None or replaced < limit):
+            more = self._more.pop(0)
+            if more.count < threshold:
+                continue
+            self._submission._reddit._request()
+            start = len(self._loaded)
+            self._loaded.extend(self._pending[start:start + more.count])
+            replaced += 1
+        self._more = []
+        return []
+
+    def list(self):
+        return list(self._loaded) + list(self._more)
+
+
+class FakeSubmission:
+    def __init__(self, reddit, number, subreddit):
+        self._reddit = reddit
+        self._number = number
+        self._loaded = False
+        self.id = to_base36(number)
+        self.fullname = "t3_" + self.id
+        rng = random.Random(number)
+        self._rng_seed = number
+        self.subreddit = FakeSubredditRef(subreddit)
+        self.title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 14))).capitalize() + "?"
+        self.selftext = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(0, 80)))
+        self.created_utc = reddit.epoch - number * 97
+        self.score = rng.randint(0, 50000)
+        self.ups = self.score
+        self.permalink = f"/r/{subreddit}/comments/{self.id}/{'_'.join(self.title.lower().split()[:5]).strip('?')}/"
+        self.url = "https://www.reddit.com" + self.permalink
+        self.author = FakeRedditor(f"user{rng.randint(1, 10000)}") if rng.random() > 0.05 else None
+        self._comments = None
+
+    def _fetch(self):
+        # The submission page (one request); praw also does this lazily on first access
+        self._reddit._request()
+        self._loaded = True
+
+    @property
+    def comments(self):
+        if not self._loaded:
+            self._fetch()
+        if self._comments is None:
+            self._comments = FakeCommentForest(self, self._reddit._make_comments(self), self._reddit.page_size)
+        return self._comments
+
+
+class FakeSubreddit:
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self.display_name = name
+
+    def _listing(self, order, limit, params=None):
+        after = (params or {}).get("after")
+        numbers = self._reddit._listing_order(order)
+        start = 0
+        if after:
+            after_number = int(after[3:], 36)
+            start = numbers.index(after_number) + 1 if after_number in numbers else len(numbers)
+        end = len(numbers) if limit is None else min(len(numbers), start + limit)
+        for page_start in range(start, end, 100):  # one request per 100 results
+            self._reddit._request()
+            for number in numbers[page_start:min(end, page_start + 100)]:
+                yield self._reddit._submission(number, self.display_name)
+
+    def top(self, time_filter="all", limit=100, params=None):
+        return self._listing(("top", time_filter), limit, params)
+
+    def controversial(self, time_filter="all", limit=100, params=None):
+        return self._listing(("controversial", time_filter), limit, params)
+
+    def hot(self, limit=100, params=None):
+        return self._listing(("hot", None), limit, params)
+
+    def new(self, limit=100, params=None):
+        return self._listing(("new", None), limit, params)
+
+
+class FakeReddit:
+    def __init__(self, username="bench", universe=1000, comments_per_thread=150, page_size=200,
+                 link_probability=0.05, latency=0.0, requests_per_window=1_000_000, window=60.0,
+                 error_429_rate=0.0, seed=0):
+        self.config = FakeConfig(username)
+        self.auth = FakeAuth(self)
+        self.universe = universe
+        self.comments_per_thread = comments_per_thread
+        self.page_size = page_size  # comments returned with the submission itself
+        self.link_probability = link_probability
+        self.latency = latency
+        self.requests_per_window = requests_per_window
+        self.window = window
+        self.error_429_rate = error_429_rate
+        self.epoch = 1700000000
+        self.requests = 0
+        self.errors_429 = 0
+        self._rng = random.Random(seed)
+        self._window_start = time.time()
+        self._used = 0
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    # --- rate limit bookkeeping -------------------------------------------------
+
+    def limits(self):
+        with self._lock:
+            self._roll_window()
+            return {"remaining": float(self.requests_per_window - self._used),
+                    "reset_timestamp": self._window_start + self.window, "used": self._used}
+
+    def _roll_window(self):
+        if time.time() >= self._window_start + self.window:
+            self._window_start = time.time()
+            self._used = 0
+
+    def _request(self):
+        with self._lock:
+            self._roll_window()
+            self.requests += 1
+            over = self._used >= self.requests_per_window
+            self._used += 1
+            if over or self._rng.random() < self.error_429_rate:
+                self.errors_429 += 1
+                reset = max(0.0, self._window_start + self.window - time.time())
+                raise TooManyRequests(FakeResponse(429, {"x-ratelimit-reset": str(int(reset))}))
+        if self.latency:
+            time.sleep(self.latency)
+
+    # --- data -------------------------------------------------------------------
+
+    def _listing_order(self, order):
+        numbers = self._orders.get(order)
+        if numbers is None:
+            numbers = list(range(1, self.universe + 1))
+            random.Random(str(order)).shuffle(numbers)
+            if order[0] == "new":
+                numbers.sort()
+            self._orders[order] = numbers
+        return numbers
+
+    def _submission(self, number, subreddit="AskReddit"):
+        return FakeSubmission(self, number, subreddit)
+
+    def _make_comments(self, submission):
+        rng = random.Random(submission._rng_seed * 7919)
+        comments = []
+        for i in range(rng.randint(0, self.comments_per_thread * 2)):
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(3, 60))]
+            if rng.random() < self.link_probability:
+                target = self._submission(rng.randint(1, self.universe), submission.subreddit.display_name)
+                words.append(target.url)
+            author = FakeRedditor(f"user{rng.randint(1, 10000)}") if rng.random() > 0.1 else None
+            comments.append(FakeComment(f"{submission.id}c{i}", author, " ".join(words),
+                                        submission.created_utc + i * 30, rng.randint(-5, 500)))
+        return comments
+
+    # --- PRAW API ---------------------------------------------------------------
+
+    def submission(self, id=None, url=None):
+        if url is not None:
+            id = url.split("/comments/")[1].split("/")[0]
+        number = int(id, 36)
+        if not 1 <= number <= self.universe:
+            raise ValueError(f"unknown submission {id}")
+        return self._submission(number)
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name)
+
+    def info(self, fullnames=None):
+        self._request()
+        for fullname in fullnames or []:
+            number = int(fullname[3:], 36)
+            if 1 <= number <= self.universe:
+                yield self._submission(number)
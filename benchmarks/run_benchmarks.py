@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Offline benchmarks for the crawler and cleaner against benchmarks/fake_reddit.py.
+#
+#   python -m benchmarks.run_benchmarks                     # run everything, print a table
+#   python -m benchmarks.run_benchmarks --output base.json  # save results
+#   python -m benchmarks.run_benchmarks --compare base.json # exit 1 on a throughput regression
+#
+# Each benchmark reports throughput, per-item latency percentiles and, with
+# --memory, the peak Python heap (tracemalloc slows the run, so it is opt-in).
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_reddit import FakeReddit, to_base36  # noqa: E402
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))] * 1000.0
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99), "max_ms": ordered[-1] * 1000.0}
+
+
+def timed(func, samples):
+    # Wrap `func` so every call's duration is appended to `samples`
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+
+def use_fake_sessions(sessions):
+    from reddit_crawler import request
+    request._sessions = list(sessions)
+    request._current = sessions[0]
+
+
+def reset_crawler(workdir, subreddit):
+    from reddit_crawler import crawler
+    crawler.output_dir = os.path.join(workdir, "data_files")
+    os.makedirs(crawler.output_dir, exist_ok=True)
+    crawler.count = 0
+    crawler.writer = None
+    crawler.processed_ids = set()
+    crawler.subreddit_home = subreddit
+    crawler.checkpoint_path = None
+    return crawler
+
+
+def bench_get_diverse_submissions(args, workdir):
+    from reddit_crawler.request import get_diverse_submissions
+    reddit = FakeReddit(universe=args.universe, latency=args.latency)
+    use_fake_sessions([reddit])
+    start = time.perf_counter()
+    submissions = get_diverse_submissions("AskReddit", limit=args.seeds)
+    elapsed = time.perf_counter() - start
+    return {"items": len(submissions), "seconds": elapsed, "items_per_sec": len(submissions) / elapsed,
+            "api_requests": reddit.requests}
+
+
+def bench_crawl_thread(args, workdir):
+    from reddit_crawler.frontier import Frontier
+    from reddit_crawler.request import SeedSource
+    crawler = reset_crawler(workdir, "AskReddit")
+    reddit = FakeReddit(universe=args.universe, comments_per_thread=args.comments, latency=args.latency,
+                        error_429_rate=args.error_rate)
+    use_fake_sessions([reddit])
+
+    frontier = Frontier()
+    crawler.seed_source = SeedSource("AskReddit", page_size=100)
+    crawler.refill_frontier(frontier, crawler.seed_source, n=args.seeds)
+    seed_requests = reddit.requests
+
+    samples = []
+    original = crawler.crawl_url
+    crawler.crawl_url = timed(original, samples)
+    start = time.perf_counter()
+    try:
+        crawler.crawl_thread(frontier)
+    finally:
+        crawler.crawl_url = original
+    elapsed = time.perf_counter() - start
+    posts = len(crawler.processed_ids)
+    result = {"items": posts, "seconds": elapsed, "items_per_sec": posts / elapsed,
+              "api_requests": reddit.requests - seed_requests,
+              "api_requests_per_post": (reddit.requests - seed_requests) / max(posts, 1),
+              "errors_429": reddit.errors_429}
+    result.update(percentiles(samples))
+    return result
+
+
+def synthetic_post(rng, i):
+    words = "what is the best advice you have ever gotten from a stranger on the internet".split()
+    return {
+        "Post Title": " ".join(rng.choice(words) for _ in range(10)),
+        "Subreddit": "AskReddit",
+        "Selftext": " ".join(rng.choice(words) for _ in range(rng.randint(0, 200))),
+        "Post ID": f"p{i}",
+        "Post Date": 1700000000 - i,
+        "Post Score": rng.randint(0, 1000),
+        "URL": f"https://www.reddit.com//r/AskReddit/comments/p{i}/x/",
+        "Links": f"https://www.reddit.com/r/AskReddit/comments/p{i}/x/",
+        "Username": f"user{i % 997}",
+        "Upvotes": rng.randint(0, 1000),
+        "Comments": [f"user{j}: " + " ".join(rng.choice(words) for _ in range(30)) for j in range(50)],
+    }
+
+
+def bench_write_json(args, workdir):
+    crawler = reset_crawler(workdir, "AskReddit")
+    rng = random.Random(1)
+    records = [synthetic_post(rng, i) for i in range(args.records)]
+    samples = []
+    write = timed(crawler.write_json, samples)
+    start = time.perf_counter()
+    for record in records:
+        write(record, False)
+    crawler.write_json({}, True)
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(os.path.join(crawler.output_dir, f)) for f in os.listdir(crawler.output_dir))
+    result = {"items": len(records), "seconds": elapsed, "items_per_sec": len(records) / elapsed,
+              "mb_per_sec": size / 1048576 / elapsed}
+    result.update(percentiles(samples))
+    return result
+
+
+def bench_clean_all_files(args, workdir):
+    import cleaner
+    reddit = FakeReddit(universe=args.universe)
+    cleaner.input_dir = os.path.join(workdir, "raw_data")
+    cleaner.output_dir = os.path.join(workdir, "cleaned_data")
+    cleaner.target_total_mb = 1 << 20
+    os.makedirs(cleaner.input_dir, exist_ok=True)
+    os.makedirs(cleaner.output_dir, exist_ok=True)
+
+    rng = random.Random(2)
+    words = "the what why how people think would best worst ever thing time life story".split()
+    for shard in range(args.shards):
+        with open(os.path.join(cleaner.input_dir, f"raw_{shard}.jsonl"), "w", encoding="utf-8") as f:
+            for i in range(args.records):
+                n = rng.randint(1, args.universe)
+                post = {"author": f"user{n % 500}", "title": " ".join(rng.choice(words) for _ in range(8)),
+                        "selftext": " ".join(rng.choice(words) for _ in range(rng.randint(0, 150))),
+                        "url": f"https://www.reddit.com/r/AskReddit/comments/{to_base36(n)}/t/"}
+                f.write(json.dumps(post) + "\n")
+    input_bytes = sum(os.path.getsize(os.path.join(cleaner.input_dir, f)) for f in os.listdir(cleaner.input_dir))
+
+    def fetch_titles(ids):
+        return {s.id: s.title for s in reddit.info(fullnames=["t3_" + i for i in ids])}
+
+    samples = []
+    original = cleaner.normalize_post
+    if args.workers <= 1:  # per-post timings are only visible in this process
+        cleaner.normalize_post = timed(original, samples)
+    resolver = cleaner.TitleResolver(os.path.join(workdir, "titles.sqlite"), fetch_titles=fetch_titles)
+    start = time.perf_counter()
+    try:
+        cleaner.clean_all_files(resolver, workers=args.workers)
+    finally:
+        cleaner.normalize_post = original
+    elapsed = time.perf_counter() - start
+    result = {"items": args.shards * args.records, "seconds": elapsed,
+              "items_per_sec": args.shards * args.records / elapsed,
+              "mb_per_sec": input_bytes / 1048576 / elapsed, "api_requests": reddit.requests}
+    result.update(percentiles(samples))
+    return result
+
+
+BENCHMARKS = {
+    "get_diverse_submissions": bench_get_diverse_submissions,
+    "crawl_thread": bench_crawl_thread,
+    "write_json": bench_write_json,
+    "clean_all_files": bench_clean_all_files,
+}
+
+
+def run(name, args):
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # the crawler and cleaner create their output folders on import
+        try:
+            if args.memory:
+                tracemalloc.start()
+            result = BENCHMARKS[name](args, workdir)
+            if args.memory:
+                result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1048576
+                tracemalloc.stop()
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+def compare(results, baseline, tolerance):
+    # Names of benchmarks whose throughput dropped more than `tolerance` below the baseline
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("items_per_sec")
+        if before and result["items_per_sec"] < before * (1 - tolerance):
+            regressions.append(f"{name}: {result['items_per_sec']:.1f}/s vs {before:.1f}/s baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--universe", type=int, default=2000, help="submissions in the fake subreddit")
+    parser.add_argument("--seeds", type=int, default=300, help="seed limit for get_diverse_submissions")
+    parser.add_argument("--comments", type=int, default=150, help="mean comments per thread")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per simulated API request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 429 per request")
+    parser.add_argument("--records", type=int, default=5000, help="records per write/clean shard")
+    parser.add_argument("--shards", type=int, default=4, help="raw input files for the cleaner")
+    parser.add_argument("--workers", type=int, default=1, help="cleaner worker processes")
+    parser.add_argument("--memory", action="store_true", help="also report peak heap via tracemalloc")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from --output to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs the baseline")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = run(name, args)
+
+    print(f"{'benchmark':<26}{'items':>8}{'items/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['items']:>8}{r['items_per_sec']:>12.1f}{r.get('p50_ms', 0):>10.2f}"
+              f"{r.get('p95_ms', 0):>10.2f}{r.get('p99_ms', 0):>10.2f}{r.get('peak_mb', 0):>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
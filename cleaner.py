@@ -2,7 +2,22 @@ import os  #used for file and directory manipulation
 import hashlib #creattes hashes for detecting duplicates
 import requests  # allows us to make HTTP requests
 import json #used for parsing JSON data
+import sqlite3 #on-disk cache of resolved titles
+import argparse #command line options
+import multiprocessing #parallel cleaning across cores
+import functools
+import collections
+import operator
+import pickle
+import sys
 import praw 
+from reddit_crawler.frontier import submission_id
+from reddit_crawler.neardup import NearDupIndex, MinHasher
+from reddit_crawler.dedup import make_store, BACKENDS, DiskDigestSet
+from reddit_crawler.writer import JsonlWriter, COMPRESSIONS
+from reddit_crawler.record import Post
+from reddit_crawler.reader import iter_records
+from reddit_crawler import metrics
 
 
 
@@ -12,86 +27,355 @@ input_dir = 'raw_data' #folder with raw json files
 output_dir = 'cleaned_data' #folder to save cleaned data
 max_file_size_mb = 10
 target_total_mb = 500
+title_cache_path = os.path.join(output_dir, 'title_cache.sqlite') #persists resolved url titles between runs
+title_batch_size = 100 #reddit.info() accepts up to 100 fullnames per request
+dedup_backend = 'set' #'compact', 'bloom' or 'disk' keep memory bounded on multi-million post runs
+near_dup_threshold = None #e.g. 0.8 to also drop posts whose title+body are at least 80% similar to an earlier one
+compression = None #'gzip' or 'zstd' writes cleaned_data_N.jsonl.gz / .zst
+rotate_on = 'uncompressed' #whether max_file_size_mb limits the uncompressed or the compressed shard size
+#incremental runs (--incremental) only clean new or changed inputs; this state carries over between them
+manifest_path = os.path.join(output_dir, 'manifest.json') #size, mtime and hash of every cleaned input + next shard number
+dedup_index_path = os.path.join(output_dir, 'dedup_index.sqlite') #exact-duplicate hashes of everything cleaned so far
+near_dup_index_path = os.path.join(output_dir, 'near_dup_index.pickle')
 
 os.makedirs(output_dir, exist_ok=True) #create output directory if it doesn't exist
 
-def read_json_lines(filepath):
-    with open(filepath, 'r', encoding = 'utf-8') as file:
-        for line in file:
-            try:
-                yield json.loads(line)
-            except json.JSONDecodeError:
-                continue #for malformed lines
+def read_json_lines(filepath, stats=None): #every record of a shard (.jsonl, .gz/.zst or a legacy .json array), memory-mapped
+    return iter_records(filepath, stats) #malformed records are counted in stats['malformed']
 
-def get_reddit_post_title(url):# fethces title from a URL
+def fetch_titles_from_reddit(ids): #fetches titles for up to 100 submission ids in one request
     try:
-        submission = reddit.submission (url = url)
-        return submission.title
+        return {submission.id: submission.title for submission in reddit.info(fullnames=['t3_' + i for i in ids])}
     except Exception:
-        return None
-    
-def clean_post(post, seen_hashes):  #cleans a single post
-    author = post.get('author')
+        return None #transient failure, nothing gets cached
+
+def link_id(post): #id of the reddit submission a post links to, or None
+    url = post.url or ''
+    return submission_id(url) if 'reddit.com' in url else None #only get reddit titles
+
+class TitleResolver: #adds url_title to posts that link to a reddit submission
+    # Posts are buffered until `batch_size` distinct IDs need a title, then resolved
+    # together: first from the on-disk cache, then the rest with one reddit.info()
+    # call per 100 IDs. Posts come out in the same order they went in.
+    # `fetch_titles` takes a list of IDs and returns {id: title}; tests can pass a stub.
+    def __init__(self, cache_path, fetch_titles=None, batch_size=title_batch_size, max_buffer=1000):
+        self.fetch_titles = fetch_titles or fetch_titles_from_reddit
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer #flush even with few lookups so memory stays bounded
+        self.db = sqlite3.connect(cache_path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS titles (id TEXT PRIMARY KEY, title TEXT)')
+
+    def process(self, posts): #the posts, with url_title filled in
+        for post, title in self.resolve(posts, link_id):
+            if title:
+                post.url_title = title
+            yield post
+
+    def resolve(self, items, sid_of): #(item, title or None) for every item, in order; sid_of(item) is the id to look up
+        buffer = []
+        pending = set()
+        for item in items:
+            sid = sid_of(item)
+            if sid:
+                pending.add(sid)
+            buffer.append((item, sid))
+            if len(pending) >= self.batch_size or len(buffer) >= self.max_buffer:
+                yield from self._flush(buffer, pending)
+                buffer, pending = [], set()
+        yield from self._flush(buffer, pending)
+
+    def _flush(self, buffer, pending):
+        titles = self._resolve(pending) if pending else {}
+        for item, sid in buffer:
+            yield item, titles.get(sid) if sid else None
+
+    def _resolve(self, ids):
+        ids = list(ids)
+        placeholders = ','.join('?' * len(ids))
+        titles = dict(self.db.execute(f'SELECT id, title FROM titles WHERE id IN ({placeholders})', ids))
+        missing = [i for i in ids if i not in titles]
+        metrics.incr('title_cache_hits_total', len(titles))
+        for start in range(0, len(missing), title_batch_size):
+            chunk = missing[start:start + title_batch_size]
+            with metrics.timer('title_fetch_seconds'):
+                fetched = self.fetch_titles(chunk)
+            if fetched is None:
+                continue
+            #remember misses too (deleted posts), so reruns don't ask again
+            rows = [(i, fetched.get(i)) for i in chunk]
+            self.db.executemany('INSERT OR REPLACE INTO titles VALUES (?, ?)', rows)
+            titles.update(rows)
+        self.db.commit()
+        return titles
+
+    def close(self):
+        self.db.close()
+
+@metrics.timed('clean_post_seconds')
+def normalize_post(post): #cleans a single raw post (either layout), returns (hash, Post) or None if it should be dropped
+    post = Post.from_dict(post)
+    author = post.author
     if not author or author.lower() in ['deleted', 'automoderator']:
         return None 
     
-    title = post.get('title', '').strip() #gets the title of the post
-    body = post.get('selftext', '').strip()
+    title = (post.title or '').strip() #gets the title of the post
+    body = (post.selftext or '').strip()
     if not title and not body:
         return None 
     
-    hash_key = hashlib.md5((title + body).encode()).hexdigest() #creates a hash of the title and body
+    hash_key = hashlib.md5((title + body).encode()).digest() #creates a hash of the title and body (16 raw bytes)
+
+    post.title = title.lower()
+    post.selftext = body.lower()
+    return hash_key, post #url_title is filled in later, in batches, by TitleResolver
+
+def clean_post(post, seen_hashes):  #cleans a single post and drops exact duplicates
+    normalized = normalize_post(post)
+    if normalized is None:
+        return None
+    hash_key, post = normalized
     if hash_key in seen_hashes:
         return None
     seen_hashes.add(hash_key) #adds the hash to the set of seen hashes  
+    return post
 
-    post['title'] = title.lower()
-    post['selftext'] = body.lower()
+def encoded_posts(posts, hasher): #(hash, MinHash signature or None, linked submission id or None, JSON line)
+    #the line is what gets written, minus url_title for posts that link to a submission; that one
+    #is resolved later (see with_url_title), so the parent process never re-encodes a post
+    for hash_key, post in posts:
+        signature = hasher.signature(post.title + ' ' + post.selftext) if hasher else None
+        sid = link_id(post)
+        if sid:
+            post.url_title = None
+        yield hash_key, signature, sid, json.dumps(post.to_cleaner()).encode()
 
-    if 'url' in post and 'reddit.com' in post['url']: #only get reddit titles
-        reddit_title = get_reddit_post_title(post['url'])
-        if reddit_title:
-            post['url_title'] = reddit_title
+def with_url_title(line, title): #adds url_title as the last key of an encoded post
+    return line[:-1] + b', "url_title": ' + json.dumps(title).encode() + b'}'
 
-    return post
+def encode_file(filepath, hasher=None): #parses, normalizes and encodes a whole input file, runs in a worker process
+    posts, stats = iter_encoded(filepath, hasher)
+    return list(posts), stats
+
+def iter_encoded(filepath, hasher=None): #(encoded posts, stats of the file filled in as the posts are consumed)
+    stats = {}
+    return encoded_posts(filter(None, map(normalize_post, read_json_lines(filepath, stats))), hasher), stats
 
-def clean_all_files():
-    seen_hashes = set() #set to keep track of seen hashes
-    current_file_index = 0 #index for the current file
-    current_file_size = 0 #size of the current file in bytes
-    outfile = open(os.path.join(output_dir, f'cleaned_data_{current_file_index}.jsonl'), 'w', encoding='utf-8') #output file
+def imap_bounded(pool, func, args, window): #pool.imap with at most `window` results in flight, so a slow
+    #consumer never has the whole corpus queued up in memory
+    pending = collections.deque()
+    for arg in args:
+        pending.append(pool.apply_async(func, (arg,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def list_input_files():
+    return sorted(f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f)))
+
+def iter_encoded_files(filepaths=None, workers=1, hasher=None): #(filepath, encoded posts, stats) of every input file, in order
+    #filepaths defaults to everything in input_dir; the stats (stats['malformed'] counts the input records
+    #that could not be parsed) are complete once all posts of the file were consumed
+    if filepaths is None:
+        filepaths = [os.path.join(input_dir, filename) for filename in list_input_files()]
+
+    pool = None
+    if workers > 1:
+        #workers parse, normalize, sign and encode whole files; results come back in input order
+        #so the output is the same as a serial run. Dedup stays global because the parent does it.
+        pool = multiprocessing.Pool(workers)
+        batches = imap_bounded(pool, functools.partial(encode_file, hasher=hasher), filepaths, window=2 * workers)
+    else:
+        batches = (iter_encoded(filepath, hasher) for filepath in filepaths)
+
+    try:
+        for filepath, (batch, file_stats) in zip(filepaths, batches):
+            yield filepath, batch, file_stats
+    finally:
+        if pool is not None:
+            pool.terminate() #also stops the workers early once target_total_mb is reached
+
+def is_duplicate(hash_key, signature, seen_hashes, near_dups): #checks a post right before it is written and records it
+    #only called for posts that are written unless they turn out to be duplicates, so the persisted
+    #dedup state never holds a post that a run stopped (target_total_mb) before writing
+    metrics.maybe_report()
+    if hash_key in seen_hashes:
+        metrics.incr('duplicates_total')
+        return True
+    seen_hashes.add(hash_key)
+    if signature is not None and near_dups.add(signature): #similar to a post we already kept
+        metrics.incr('near_duplicates_total')
+        return True
+    return False
+
+def file_digest(filepath): #sha1 of the file contents, read in 1MB chunks
+    sha1 = hashlib.sha1()
+    with open(filepath, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def load_manifest(path=None):
+    path = path or manifest_path
+    if not os.path.exists(path):
+        return {'files': {}, 'next_shard': 0, 'hash_rows': 0}
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def save_manifest(manifest, path=None): #written to a temporary file and renamed, so it is never half-written
+    path = path or manifest_path
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(path + '.tmp', path)
+
+def changed_inputs(manifest): #returns (files to clean, manifest entries to record once they are cleaned)
+    todo = []
+    entries = {}
+    for filename in list_input_files():
+        filepath = os.path.join(input_dir, filename)
+        stat = os.stat(filepath)
+        old = manifest['files'].get(filename)
+        if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime:
+            continue #unchanged, not even hashed
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': file_digest(filepath)}
+        if old and old['sha1'] == entry['sha1']:
+            manifest['files'][filename] = entry #only touched
+            continue
+        todo.append(filepath)
+        entries[filepath] = entry
+    return todo, entries
+
+def load_near_dups(threshold, incremental, run=None):
+    if not threshold:
+        return None
+    if incremental and os.path.exists(near_dup_index_path):
+        with open(near_dup_index_path, 'rb') as file:
+            near_dups = pickle.load(file)
+        if getattr(near_dups.hasher, 'version', 1) != MinHasher.version:
+            print("Near-duplicate index is from an older signature version, rebuilding from new inputs only")
+        elif getattr(near_dups, 'run', None) != run:
+            #saved by a run that crashed before its manifest: it holds posts the manifest does not cover
+            print("Near-duplicate index does not match the manifest, rebuilding from new inputs only")
+        elif near_dups.threshold == threshold:
+            return near_dups
+        else:
+            print("Near-duplicate threshold changed, rebuilding from new inputs only")
+    return NearDupIndex(threshold)
+
+def clean_all_files(title_resolver=None, workers=1, near_dup_threshold=near_dup_threshold, dedup=dedup_backend,
+                    compression=compression, rotate_on=rotate_on, incremental=False):
+    #incremental=True cleans only inputs that are new or changed since the last run (see manifest_path) and
+    #appends them as new shards, deduplicated against everything cleaned before. A full run starts over at
+    #cleaned_data_0; both record the manifest and the hash indexes the next incremental run builds on.
+    if not incremental:
+        for path in (manifest_path, dedup_index_path, near_dup_index_path):
+            if os.path.exists(path):
+                os.remove(path)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest()
+    filepaths, entries = changed_inputs(manifest)
+    #committed before the manifest; rows added after the manifest's 'hash_rows' are from a run that never
+    #saved its manifest, so they are dropped again
+    hash_index = DiskDigestSet(dedup_index_path, commit_every=sys.maxsize)
+    hash_index.checkpoint_rows = manifest.get('hash_rows') #None for manifests from before it was recorded
+    hash_index.rollback_to_checkpoint()
+    if incremental or dedup == 'disk':
+        seen_hashes = hash_index
+    else:
+        seen_hashes = make_store(dedup) #the index only records what was written
+    first_shard = manifest['next_shard']
+    if incremental:
+        print(f"Incremental run: {len(filepaths)} new or changed input files, output starts at shard {first_shard}")
+    near_dups = load_near_dups(near_dup_threshold, incremental, manifest.get('run'))
+    completed = [] #input files whose posts have all been written
+    input_stats = {'malformed': 0}
+    #cleaned_data_0.jsonl, cleaned_data_1.jsonl, ...; a new file is started before a post would exceed the limit
+    outfile = JsonlWriter(output_dir, 'cleaned_data_', index=first_shard, max_bytes=max_file_size_mb * 1024 * 1024,
+                          split_before=True, ensure_ascii=True, compression=compression, rotate_on=rotate_on)
 
     total_written = 0 #total number of bytes written to the output file
 
-    input_files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
-    for filename in input_files:
-        filepath = os.path.join(input_dir, filename) #path to the input file
-        for post in read_json_lines(filepath):
-            cleaned = clean_post(post, seen_hashes)
-            if cleaned:
-                line = json.dumps(cleaned) + '\n' #convert the cleaned post to a JSON string
-                line_size = len(line.encode('utf-8')) #size of the line in bytes
-
-                if current_file_size + line_size > max_file_size_mb * 1024 * 1024: #if the current file size exceeds the limit
-                    outfile.close()
-                    current_file_index += 1
-                    current_file_size = 0
-                    outfile = open(os.path.join(output_dir, f'cleaned_data_{current_file_index}.jsonl'), 'w', encoding='utf-8') #create a new output file
-
-                outfile.write(line) #write the cleaned post to the output file
-                current_file_size += line_size
+    if title_resolver is None:
+        title_resolver = TitleResolver(title_cache_path)
+    try:
+        hasher = near_dups.hasher if near_dups is not None else None
+        for filepath, batch, file_stats in iter_encoded_files(filepaths, workers, hasher):
+            #titles are resolved before dedup, so nothing is marked as seen while the resolver holds it
+            for (hash_key, signature, sid, line), title in title_resolver.resolve(batch, operator.itemgetter(2)):
+                if is_duplicate(hash_key, signature, seen_hashes, near_dups):
+                    continue
+                if seen_hashes is not hash_index:
+                    hash_index.add(hash_key)
+                with metrics.timer('write_seconds'):
+                    #write the cleaned post, returns its uncompressed size in bytes
+                    line_size = outfile.write_encoded(with_url_title(line, title) if title else line)
+                metrics.incr('posts_written_total')
+                metrics.incr('bytes_written_total', line_size)
                 total_written += line_size
 
                 if total_written >= target_total_mb * 1024 * 1024: #if the total size exceeds the target size
-                    print(f"Total size of cleaned data: {total_written / (1024 * 1024):.2f} MB")
-                    outfile.close()
-                    return
+                    break
+            else:
+                if file_stats['malformed']:
+                    metrics.incr('malformed_records_total', file_stats['malformed'])
+                    input_stats['malformed'] += file_stats['malformed']
+                completed.append(filepath)
+                continue
+            break #stopped inside this file, so it is not completed
+        outfile.close() #close the output file
+        #files cut off by target_total_mb stay out of the manifest and are cleaned again next time
+        for filepath in completed:
+            manifest['files'][os.path.basename(filepath)] = entries[filepath]
+        manifest['next_shard'] = outfile.index
+        manifest['run'] = manifest.get('run', 0) + 1
+        hash_index.commit()
+        manifest['hash_rows'] = hash_index.rows()
+        if near_dups is not None:
+            near_dups.run = manifest['run']
+            with open(near_dup_index_path + '.tmp', 'wb') as file:
+                pickle.dump(near_dups, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(near_dup_index_path + '.tmp', near_dup_index_path)
+        save_manifest(manifest)
+    except BaseException:
+        hash_index.rollback()
+        raise
+    finally:
+        outfile.close()
+        title_resolver.close()
+        hash_index.close()
+        if seen_hashes is not hash_index and hasattr(seen_hashes, 'close'):
+            seen_hashes.close()
                 
-    outfile.close() #close the output file
     print(f"Total size of cleaned data: {total_written / (1024 * 1024):.2f} MB") #print the total size of the cleaned data
+    if input_stats['malformed']:
+        print(f"Malformed input records skipped: {input_stats['malformed']}")
+    if near_dups is not None:
+        print(f"Near-duplicates dropped: {near_dups.dropped} of {near_dups.checked} (threshold {near_dups.threshold})")
 
 if __name__ == '__main__':
-    clean_all_files() #call the function to clean all files
+    parser = argparse.ArgumentParser(description='Clean raw reddit data into deduplicated jsonl shards')
+    parser.add_argument('--workers', type=int, default=1, help='processes used for parsing and cleaning (0 = one per core)')
+    parser.add_argument('--near-dup', type=float, default=near_dup_threshold, metavar='THRESHOLD',
+                        help='also drop near-duplicates with estimated similarity >= THRESHOLD (e.g. 0.8)')
+    parser.add_argument('--dedup', choices=BACKENDS,
+                        help=f'store used for exact duplicate hashes in a full run (default: {dedup_backend})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only clean new or changed input files and append them as new shards')
+    parser.add_argument('--compress', choices=[c for c in COMPRESSIONS if c], help='write gzip or zstd compressed shards')
+    parser.add_argument('--rotate-on', default=rotate_on, choices=['uncompressed', 'compressed'],
+                        help='which shard size the 10MB limit applies to')
+    parser.add_argument('--metrics', metavar='PATH', help='write run metrics to PATH (.json, or .prom for Prometheus text)')
+    parser.add_argument('--metrics-interval', type=float, metavar='SECONDS', help='print a metrics summary line every SECONDS')
+    args = parser.parse_args()
+    if args.incremental and args.dedup not in (None, 'disk'):
+        parser.error('--incremental always deduplicates against the on-disk hash index, --dedup does not apply')
+    if args.metrics or args.metrics_interval:
+        metrics.enable(interval=args.metrics_interval, path=args.metrics)
+    clean_all_files(workers=args.workers or os.cpu_count(), near_dup_threshold=args.near_dup, dedup=args.dedup or dedup_backend,
+                    compression=args.compress, rotate_on=args.rotate_on, incremental=args.incremental) #call the function to clean all files
     print("Cleaning completed.")
+    if metrics.enabled:
+        print(metrics.summary_line())
+        metrics.dump()
     
     
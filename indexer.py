@@ -0,0 +1,717 @@
+import argparse
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from itertools import accumulate
+
+from reddit_crawler.record import Post
+from reddit_crawler.writer import open_shard
+
+# Inverted index over the cleaner's output (cleaned_data_*.jsonl[.gz|.zst]).
+#
+#   python indexer.py build                              # index new shards
+#   python indexer.py search "black hole" --subreddit askscience --after 2024-01-01
+#   python indexer.py merge --max-segments 1             # compact into one segment
+#
+# Shards are read as a stream and indexed into immutable segments of at most
+# `segment_docs` posts, so memory stays bounded however large the corpus is. A segment
+# is five flat files, memory-mapped (or, for .time, read) when querying:
+#
+#   .lex    sorted term table, fixed 28-byte entries (binary searched in place)
+#   .terms  the term strings the .lex entries point into
+#   .post   postings: per term, a block directory and blocks of 128 varint
+#           (doc-id delta, term frequency) pairs
+#   .docs   per post: subreddit, date, length, shard and byte offset of the record
+#   .time   the posts in created_utc order: the sorted dates, then the doc ids
+#
+# index/meta.json lists the segments and the shards already indexed; it is replaced
+# atomically, so a crash mid-build or mid-merge leaves the previous index usable.
+# Rebuilding after new shards only indexes those; merge() folds small segments together.
+#
+# Title, selftext and comments are searchable; subreddits are indexed as the extra
+# term "r/<name>", so subreddit filters are a postings lookup, not a scan. Results are
+# ranked with BM25.
+#
+# The block directory holds each block's last doc id, size and best BM25 impact, so
+# queries only decode the blocks they need: top-k ranking skips blocks whose best possible
+# score cannot reach the current k-th best hit (block-max pruning), and the other query
+# terms and the subreddit filter are only read for the doc range of the blocks it keeps.
+# Common terms and big subreddits no longer mean decoding every posting in Python.
+# Date ranges are bisected in .time: listings without keywords walk it newest first,
+# and a keyword query over a narrow range only scores the posts inside it.
+
+index_dir = "index"
+input_dir = "cleaned_data"
+segment_docs = 100_000  # posts per segment while building
+max_segments = 8  # merge the smallest segments once there are more than this
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TOKEN = 40
+
+_LEX = struct.Struct("<QIQII")  # term offset, term length, postings offset, postings length, doc frequency
+_BLOCK = struct.Struct("<IIf")  # last doc id, payload bytes, highest impact (see encode_postings)
+BLOCK_SIZE = 128  # postings per block
+INDEX_VERSION = 3  # bumped when the segment format changes; older indexes are rebuilt
+_DOC = struct.Struct("<IdIIQ")  # subreddit code, created_utc, length in tokens, shard code, byte offset
+_EXTENSIONS = (".lex", ".terms", ".post", ".docs", ".time")
+
+Hit = namedtuple("Hit", "score segment doc subreddit created")
+
+
+def tokenize(text: str):
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) <= MAX_TOKEN]
+
+
+def subreddit_term(name: str) -> str:
+    return "r/" + name.lower()
+
+
+def post_fields(post: dict):
+    # (subreddit, created_utc, searchable text) for either record layout
+    post = Post.from_dict(post)
+    text = " ".join([post.title or "", post.selftext or ""] + [c.body for c in post.comments])
+    return post.subreddit or "", float(post.created_utc or 0.0), text
+
+
+# Postings: blocks of BLOCK_SIZE varint-encoded (doc id - previous doc id, term frequency)
+# pairs, behind a directory with one _BLOCK entry per block. Deltas restart from the last
+# doc of the previous block, so every block decodes on its own.
+
+def _varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def impact(tf: int, length: int, avg_len: float) -> float:
+    # A term's BM25 score in a doc, before multiplying by the term's idf
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+
+
+def encode_postings(docs, tfs, lengths, avg_len: float) -> bytes:
+    # `lengths[doc]` is the doc's token count and `avg_len` the segment's average, for the
+    # block impacts. Rounded up, as they are bounds.
+    directory = bytearray()
+    payload = bytearray()
+    previous = 0
+    for start in range(0, len(docs), BLOCK_SIZE):
+        block_docs = docs[start:start + BLOCK_SIZE]
+        block_tfs = tfs[start:start + BLOCK_SIZE]
+        block = bytearray()
+        for doc, tf in zip(block_docs, block_tfs):
+            _varint(block, doc - previous)
+            _varint(block, tf)
+            previous = doc
+        best = max(impact(tf, lengths[doc], avg_len) for doc, tf in zip(block_docs, block_tfs))
+        directory += _BLOCK.pack(previous, len(block), best * (1 + 1e-6))
+        payload += block
+    return bytes(directory + payload)
+
+
+def decode_block(data, previous: int = 0):
+    # (doc ids, term frequencies) of one block; `previous` is the last doc of the block before
+    if max(data) < 0x80:
+        # Every value fits in one byte, the usual case for dense (common) terms
+        return list(accumulate(data[0::2], initial=previous))[1:], list(data[1::2])
+    docs = []
+    tfs = []
+    doc = previous
+    value = shift = 0
+    is_tf = False
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if is_tf:
+            tfs.append(value)
+        else:
+            doc += value
+            docs.append(doc)
+        is_tf = not is_tf
+        value = shift = 0
+    return docs, tfs
+
+
+class Postings:
+    # One term's postings in one segment, decoded a block at a time as they are needed
+
+    def __init__(self, data=b"", df: int = 0):
+        size = -(-df // BLOCK_SIZE) * _BLOCK.size
+        self.blocks = list(_BLOCK.iter_unpack(data[:size]))
+        self.last_docs = [block[0] for block in self.blocks]
+        self.df = df
+        self._data = data
+        self._offsets = list(accumulate((block[1] for block in self.blocks), initial=size))
+        self._decoded = {}
+
+    def __len__(self):
+        return self.df
+
+    def block(self, i: int):
+        decoded = self._decoded.get(i)
+        if decoded is None:
+            previous = self.last_docs[i - 1] if i else 0
+            decoded = self._decoded[i] = decode_block(self._data[self._offsets[i]:self._offsets[i + 1]], previous)
+        return decoded
+
+    def tf(self, doc: int) -> int:
+        # Term frequency of `doc`, 0 if the term is not in it; decodes at most one block
+        i = bisect_left(self.last_docs, doc)
+        if i == len(self.blocks):
+            return 0
+        docs, tfs = self.block(i)
+        j = bisect_left(docs, doc)
+        return tfs[j] if j < len(docs) and docs[j] == doc else 0
+
+    def __contains__(self, doc: int) -> bool:
+        return self.tf(doc) > 0
+
+    def between(self, first: int, last: int) -> dict:
+        # doc -> term frequency for the blocks that can hold docs first..last; may include
+        # docs outside the range
+        found = {}
+        for i in range(bisect_left(self.last_docs, first), len(self.blocks)):
+            docs, tfs = self.block(i)
+            found.update(zip(docs, tfs))
+            if self.last_docs[i] >= last:
+                break
+        return found
+
+    def all(self):
+        docs = []
+        tfs = []
+        for i in range(len(self.blocks)):
+            block_docs, block_tfs = self.block(i)
+            docs += block_docs
+            tfs += block_tfs
+        return docs, tfs
+
+
+def _replace_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+class SegmentBuilder:
+    # Accumulates postings in memory, then writes them out as one segment
+
+    def __init__(self):
+        self.postings = {}  # term -> (doc ids, term frequencies)
+        self.lengths = array("I")
+        self.docs = bytearray()
+        self.count = 0
+        self.total_len = 0
+
+    def add(self, tokens, subreddit_code, created, shard_code, offset, subreddit=None):
+        doc = self.count
+        self.count += 1
+        self.total_len += len(tokens)
+        self.lengths.append(len(tokens))
+        counts = Counter(tokens)
+        if subreddit:
+            counts[subreddit_term(subreddit)] = 1
+        for term, tf in counts.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("I"), array("I"))
+            entry[0].append(doc)
+            entry[1].append(tf)
+        self.docs += _DOC.pack(subreddit_code, created, len(tokens), shard_code, offset)
+
+    def write(self, base: str):
+        avg_len = self.total_len / self.count
+        write_segment(base, ((term, encode_postings(*self.postings[term], self.lengths, avg_len), len(self.postings[term][0]))
+                             for term in sorted(self.postings)), self.docs)
+        return {"name": os.path.basename(base), "docs": self.count, "total_len": self.total_len}
+
+
+def write_segment(base: str, terms, docs: bytes):
+    # `terms` yields (term, encoded postings, doc frequency) in sorted order
+    with open(base + ".lex", "wb") as lex, open(base + ".terms", "wb") as names, \
+            open(base + ".post", "wb") as post:
+        term_offset = post_offset = 0
+        for term, data, df in terms:
+            encoded = term.encode("utf-8")
+            lex.write(_LEX.pack(term_offset, len(encoded), post_offset, len(data), df))
+            names.write(encoded)
+            post.write(data)
+            term_offset += len(encoded)
+            post_offset += len(data)
+    with open(base + ".docs", "wb") as f:
+        f.write(docs)
+    created = [fields[1] for fields in _DOC.iter_unpack(docs)]
+    order = sorted(range(len(created)), key=created.__getitem__)
+    with open(base + ".time", "wb") as f:
+        for values in (array("d", (created[doc] for doc in order)), array("I", order)):
+            if sys.byteorder == "big":
+                values.byteswap()  # little-endian on disk, like the structs
+            values.tofile(f)
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class Segment:
+    # Read-only, memory-mapped view of one segment
+
+    def __init__(self, base: str):
+        self.base = base
+        self.lex = _map(base + ".lex")
+        self.terms = _map(base + ".terms")
+        self.post = _map(base + ".post")
+        self.docs = _map(base + ".docs")
+        self.term_count = len(self.lex) // _LEX.size
+        self.doc_count = len(self.docs) // _DOC.size
+        self._lengths = None
+        self._time_order = None
+
+    @property
+    def time_order(self):
+        # (created_utc ascending, the doc ids in that order), read once per segment
+        if self._time_order is None:
+            created, docs = array("d"), array("I")
+            with open(self.base + ".time", "rb") as f:
+                created.fromfile(f, self.doc_count)
+                docs.fromfile(f, self.doc_count)
+            if sys.byteorder == "big":
+                created.byteswap()
+                docs.byteswap()
+            self._time_order = created, docs
+        return self._time_order
+
+    def window(self, after: float = None, before: float = None):
+        # Positions lo..hi in time_order of the docs created in [after, before)
+        created = self.time_order[0]
+        lo = 0 if after is None else bisect_left(created, after)
+        hi = len(created) if before is None else bisect_left(created, before)
+        return lo, max(lo, hi)
+
+    @property
+    def lengths(self):
+        # Token count of every doc, unpacked once per segment for BM25 length normalization
+        if self._lengths is None:
+            self._lengths = array("I", (fields[2] for fields in _DOC.iter_unpack(self.docs)))
+        return self._lengths
+
+    def _term_at(self, i):
+        term_offset, term_len, post_offset, post_len, df = _LEX.unpack_from(self.lex, i * _LEX.size)
+        return self.terms[term_offset:term_offset + term_len], post_offset, post_len, df
+
+    def lookup(self, term: str):
+        # (postings offset, length, doc frequency) or None; binary search over the mapped table
+        key = term.encode("utf-8")
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.term_count:
+            found, post_offset, post_len, df = self._term_at(lo)
+            if found == key:
+                return post_offset, post_len, df
+        return None
+
+    def postings(self, term: str) -> Postings:
+        entry = self.lookup(term)
+        if entry is None:
+            return Postings()
+        return Postings(self.post[entry[0]:entry[0] + entry[1]], entry[2])
+
+    def doc(self, doc: int):
+        return _DOC.unpack_from(self.docs, doc * _DOC.size)
+
+    def iter_terms(self):
+        for i in range(self.term_count):
+            term, post_offset, post_len, df = self._term_at(i)
+            yield term, Postings(self.post[post_offset:post_offset + post_len], df)
+
+    def close(self):
+        for m in (self.lex, self.terms, self.post, self.docs):
+            if isinstance(m, mmap.mmap):
+                m.close()
+
+
+def _tagged(terms, i):
+    # (term, segment number, postings), so heapq.merge keeps segments in order per term
+    for term, postings in terms:
+        yield term, i, postings
+
+
+class Index:
+    def __init__(self, path: str = index_dir):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {"version": INDEX_VERSION, "segments": [], "subreddits": [], "shards": {}, "next_segment": 0}
+        self._subreddit_codes = {name: i for i, name in enumerate(self.meta["subreddits"])}
+        self._segments = None
+
+    # -- building --
+
+    def _segment_base(self, name):
+        return os.path.join(self.path, name)
+
+    def _new_segment_name(self):
+        name = f"seg_{self.meta['next_segment']:06d}"
+        self.meta["next_segment"] += 1
+        return name
+
+    def _subreddit_code(self, name):
+        code = self._subreddit_codes.get(name)
+        if code is None:
+            code = self._subreddit_codes[name] = len(self.meta["subreddits"])
+            self.meta["subreddits"].append(name)
+        return code
+
+    def _save(self):
+        _replace_json(self.meta_path, self.meta)
+
+    def build(self, source_dir: str = input_dir, docs_per_segment: int = segment_docs) -> int:
+        # Index every shard in `source_dir` not indexed yet; returns the number of posts added.
+        # If an indexed shard changed or disappeared (e.g. a full re-clean), start over.
+        shards = sorted(f for f in os.listdir(source_dir)
+                        if f.endswith((".jsonl", ".jsonl.gz", ".jsonl.zst")))
+        if self.meta.get("version") != INDEX_VERSION:
+            print("The index format changed, rebuilding the index")
+            self.clear()
+        indexed = self.meta["shards"]
+        for name, info in indexed.items():
+            path = os.path.join(source_dir, name)
+            if not os.path.exists(path) or os.path.getsize(path) != info["size"]:
+                print(f"{name} changed since it was indexed, rebuilding the index")
+                self.clear()
+                break
+
+        added = 0
+        builder = SegmentBuilder()
+        for name in shards:
+            if name in self.meta["shards"]:
+                continue
+            path = os.path.join(source_dir, name)
+            shard_code = len(self.meta["shards"])
+            offset = 0
+            with open_shard(path) as f:
+                for line in f:
+                    start = offset
+                    offset += len(line)
+                    try:
+                        post = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(post, dict):
+                        continue
+                    subreddit, created, text = post_fields(post)
+                    builder.add(tokenize(text), self._subreddit_code(subreddit), created, shard_code, start,
+                                subreddit=subreddit)
+                    added += 1
+                    if builder.count >= docs_per_segment:
+                        self._add_segment(builder)
+                        builder = SegmentBuilder()
+            self.meta["shards"][name] = {"code": shard_code, "size": os.path.getsize(path),
+                                         "path": os.path.abspath(path)}
+        if builder.count:
+            self._add_segment(builder)
+        self._save()
+        if len(self.meta["segments"]) > max_segments:
+            self.merge(max_segments)
+        return added
+
+    def _add_segment(self, builder):
+        # meta.json is only saved once the whole build is done: after a crash the next
+        # build redoes it, overwriting the unlisted segment files
+        name = self._new_segment_name()
+        self.meta["segments"].append(builder.write(self._segment_base(name)))
+        self.close()  # reopened with the new segment on the next query
+
+    def merge(self, target: int = 1):
+        # Merge the smallest segments until at most `target` remain
+        target = max(1, target)
+        self.close()
+        while len(self.meta["segments"]) > target:
+            segments = sorted(self.meta["segments"], key=lambda s: s["docs"])
+            group = segments[:len(self.meta["segments"]) - target + 1]
+            self._merge_group(group)
+
+    def _merge_group(self, group):
+        readers = [Segment(self._segment_base(s["name"])) for s in group]
+        bases = []
+        base = 0
+        for s in group:
+            bases.append(base)
+            base += s["docs"]
+
+        lengths = array("I")
+        for reader in readers:
+            lengths += reader.lengths
+        avg_len = sum(s["total_len"] for s in group) / len(lengths)
+
+        def terms():
+            streams = [_tagged(reader.iter_terms(), i) for i, reader in enumerate(readers)]
+            current, docs, tfs = None, [], []
+            for term, i, postings in heapq.merge(*streams, key=lambda item: item[:2]):
+                if term != current:
+                    if current is not None:
+                        yield current.decode("utf-8"), encode_postings(docs, tfs, lengths, avg_len), len(docs)
+                    current, docs, tfs = term, [], []
+                part_docs, part_tfs = postings.all()
+                docs += [d + bases[i] for d in part_docs]
+                tfs += part_tfs
+            if current is not None:
+                yield current.decode("utf-8"), encode_postings(docs, tfs, lengths, avg_len), len(docs)
+
+        name = self._new_segment_name()
+        write_segment(self._segment_base(name), terms(), b"".join(bytes(r.docs) for r in readers))
+        for reader in readers:
+            reader.close()
+        merged = {"name": name, "docs": sum(s["docs"] for s in group),
+                  "total_len": sum(s["total_len"] for s in group)}
+        names = {s["name"] for s in group}
+        self.meta["segments"] = [s for s in self.meta["segments"] if s["name"] not in names] + [merged]
+        self._save()
+        for old in names:
+            for ext in _EXTENSIONS:
+                os.remove(self._segment_base(old) + ext)
+
+    def clear(self):
+        self.close()
+        for s in self.meta["segments"]:
+            for ext in _EXTENSIONS:
+                path = self._segment_base(s["name"]) + ext
+                if os.path.exists(path):
+                    os.remove(path)
+        self.meta = {"version": INDEX_VERSION, "segments": [], "subreddits": [], "shards": {},
+                     "next_segment": self.meta["next_segment"]}
+        self._subreddit_codes = {}
+        self._save()
+
+    # -- querying --
+
+    @property
+    def segments(self):
+        if self._segments is None:
+            self._segments = [Segment(self._segment_base(s["name"])) for s in self.meta["segments"]]
+        return self._segments
+
+    def close(self):
+        if self._segments is not None:
+            for segment in self._segments:
+                segment.close()
+            self._segments = None
+
+    def search(self, query: str = "", subreddit: str = None, after: float = None, before: float = None,
+               k: int = 10, require_all: bool = False):
+        # Top `k` hits by BM25 for the words in `query`, optionally restricted to one
+        # subreddit and a created_utc range. With require_all every word must match.
+        # An empty query lists matching posts, newest first.
+        if self.meta.get("version") != INDEX_VERSION and self.meta["segments"]:
+            raise RuntimeError(f"{self.path} was built by an older indexer, run `indexer.py build` to rebuild it")
+        terms = list(dict.fromkeys(tokenize(query)))
+        doc_count = sum(s["docs"] for s in self.meta["segments"])
+        if not doc_count or k <= 0:
+            return []
+        avg_len = sum(s["total_len"] for s in self.meta["segments"]) / doc_count
+        idf = {}
+        for term in terms:
+            df = sum(entry[2] for entry in (seg.lookup(term) for seg in self.segments) if entry)
+            idf[term] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+        # `top` is a min-heap of the best k hits so far across all segments, by score (or
+        # by date for an empty query); once it is full, its root is the bar to clear.
+        top = []
+        order = 0
+
+        def offer(key, number, segment, doc, score=0.0):
+            nonlocal order
+            code, created, _, _, _ = segment.doc(doc)
+            entry = (key, -order, Hit(score, number, doc, self.meta["subreddits"][code], created))
+            order += 1
+            if len(top) < k:
+                heapq.heappush(top, entry)
+            else:
+                heapq.heapreplace(top, entry)
+
+        if not terms:
+            # Newest first: walk each segment's date order down from the end of the range,
+            # or, for a subreddit too small to come up often that way, scan its postings
+            for number, segment in enumerate(self.segments):
+                allowed = segment.postings(subreddit_term(subreddit)) if subreddit else None
+                if allowed is not None and not allowed:
+                    continue
+                created, docs = segment.time_order
+                lo, hi = segment.window(after, before)
+                if allowed is None or k * (hi - lo) < len(allowed) ** 2:
+                    for i in range(hi - 1, lo - 1, -1):
+                        if len(top) == k and created[i] <= top[0][0]:
+                            break
+                        if allowed is None or docs[i] in allowed:
+                            offer(created[i], number, segment, docs[i])
+                else:
+                    for doc in allowed.all()[0]:
+                        when = segment.doc(doc)[1]
+                        if (after is None or when >= after) and (before is None or when < before) \
+                                and (len(top) < k or when > top[0][0]):
+                            offer(when, number, segment, doc)
+            return [entry[2] for entry in sorted(top, reverse=True)]
+
+        # Block-max pruning. Terms drive in turn from the highest possible score down, a
+        # block at a time: a doc first met in term j can only score its block's bound plus
+        # the best of the terms after j (had it been in an earlier term it would already
+        # be scored), so blocks below the bar are never decoded. The other terms and the
+        # subreddit are merged in over the kept block's doc range only. With require_all
+        # only the rarest term drives, and every other term has to match. When a date
+        # range holds fewer posts than there are postings to go through, the posts in the
+        # range are scored directly instead.
+        for number, (segment, info) in enumerate(zip(self.segments, self.meta["segments"])):
+            allowed = None
+            if subreddit:
+                allowed = segment.postings(subreddit_term(subreddit))
+                if not allowed:
+                    continue
+            lists = {term: segment.postings(term) for term in terms}
+            if require_all and not all(lists.values()):
+                continue
+            lengths = segment.lengths
+            if after is not None or before is not None:
+                lo, hi = segment.window(after, before)
+                if (hi - lo) * len(terms) < sum(map(len, lists.values())):
+                    for doc in sorted(segment.time_order[1][lo:hi]):
+                        score = 0.0
+                        for term in terms:
+                            tf = lists[term].tf(doc)
+                            if tf:
+                                score += idf[term] * impact(tf, lengths[doc], avg_len)
+                            elif require_all:
+                                break
+                        else:
+                            if score and (len(top) < k or score > top[0][0]) \
+                                    and (allowed is None or doc in allowed):
+                                offer(score, number, segment, doc, score)
+                    continue
+            # Block impacts are for the segment's own average length; a longer corpus
+            # average can raise a doc's score by at most their ratio
+            scale = max(1.0, avg_len * info["docs"] / info["total_len"])
+            bounds = {term: [idf[term] * scale * block[2] for block in postings.blocks]
+                      for term, postings in lists.items()}
+            best = {term: max(bounds[term], default=0.0) for term in terms}
+            if require_all:
+                drivers = [min(terms, key=lambda term: len(lists[term]))]
+            else:
+                drivers = sorted((term for term in terms if lists[term]), key=best.get, reverse=True)
+            scored = set()
+            for j, driver in enumerate(drivers):
+                others = [term for term in terms if term != driver]
+                rest = sum(best[term] for term in (others if require_all else drivers[j + 1:]))
+                postings = lists[driver]
+                weight = idf[driver]
+                for i, bound in enumerate(bounds[driver]):
+                    if len(top) == k and bound + rest < top[0][0]:
+                        continue
+                    docs, tfs = postings.block(i)
+                    first, last = docs[0], docs[-1]
+                    scores = {doc: weight * impact(tf, lengths[doc], avg_len)
+                              for doc, tf in zip(docs, tfs) if doc not in scored}
+                    scored.update(scores)
+                    if allowed is not None:
+                        members = allowed.between(first, last)
+                        scores = {doc: score for doc, score in scores.items() if doc in members}
+                    for term in others:
+                        found = lists[term].between(first, last)
+                        if require_all:
+                            scores = {doc: score for doc, score in scores.items() if doc in found}
+                        weight_other = idf[term]
+                        for doc in scores.keys() & found.keys():
+                            scores[doc] += weight_other * impact(found[doc], lengths[doc], avg_len)
+                    for doc, score in scores.items():
+                        if len(top) == k and score <= top[0][0]:
+                            continue
+                        created = segment.doc(doc)[1]
+                        if (after is not None and created < after) or (before is not None and created >= before):
+                            continue
+                        offer(score, number, segment, doc, score)
+        return [entry[2] for entry in sorted(top, reverse=True)]
+
+    def document(self, hit: Hit) -> dict:
+        # Load the full record of a hit from its shard
+        _, _, _, shard_code, offset = self.segments[hit.segment].doc(hit.doc)
+        path = next(info["path"] for info in self.meta["shards"].values() if info["code"] == shard_code)
+        with open_shard(path) as f:
+            if path.endswith((".gz", ".zst")):
+                while offset:
+                    offset -= len(f.read(min(offset, 1 << 20)))
+            else:
+                f.seek(offset)
+            return json.loads(f.readline())
+
+
+def parse_date(value: str) -> float:
+    # YYYY-MM-DD (UTC) or a unix timestamp
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query an inverted index over cleaned reddit data")
+    parser.add_argument("--index", default=index_dir, help="index directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index new cleaned shards")
+    build.add_argument("--input", default=input_dir, help="directory with the cleaned shards")
+    build.add_argument("--segment-docs", type=int, default=segment_docs, help="posts per segment")
+    search = commands.add_parser("search", help="keyword / subreddit / date query")
+    search.add_argument("query", nargs="?", default="")
+    search.add_argument("--subreddit")
+    search.add_argument("--after", type=parse_date, help="YYYY-MM-DD or unix time")
+    search.add_argument("--before", type=parse_date, help="YYYY-MM-DD or unix time")
+    search.add_argument("-k", type=int, default=10, help="number of results")
+    search.add_argument("--all", action="store_true", help="every word must match")
+    merge = commands.add_parser("merge", help="merge segments")
+    merge.add_argument("--max-segments", type=int, default=1)
+    args = parser.parse_args()
+
+    index = Index(args.index)
+    if args.command == "build":
+        start = time.perf_counter()
+        added = index.build(args.input, args.segment_docs)
+        print(f"Indexed {added} posts in {time.perf_counter() - start:.1f}s "
+              f"({len(index.meta['segments'])} segments)")
+    elif args.command == "merge":
+        index.merge(args.max_segments)
+        print(f"{len(index.meta['segments'])} segments")
+    else:
+        start = time.perf_counter()
+        hits = index.search(args.query, subreddit=args.subreddit, after=args.after, before=args.before,
+                            k=args.k, require_all=args.all)
+        elapsed = time.perf_counter() - start
+        for hit in hits:
+            post = index.document(hit)
+            title = Post.from_dict(post).title or ""
+            date = datetime.fromtimestamp(hit.created, timezone.utc).strftime("%Y-%m-%d")
+            print(f"{hit.score:7.2f}  r/{hit.subreddit:<20} {date}  {title[:80]}")
+        print(f"{len(hits)} results in {elapsed * 1000:.1f}ms")
@@ -0,0 +1,28 @@
+import gzip
+import os
+import pickle
+
+# Crawl checkpoints: one gzip-compressed pickle of the crawl state (frontier,
+# visited/processed IDs, writer position, file counters).
+#
+# A snapshot is written to a temporary file, fsynced and then renamed over the
+# previous one, so a crash while saving leaves the last good checkpoint intact.
+
+
+def dumps(state: dict) -> bytes:
+    return gzip.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), compresslevel=1)
+
+
+def save_checkpoint(path: str, data: bytes):
+    # `data` comes from dumps(); serialize under the crawl locks, write outside them.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    with open(path, "rb") as f:
+        return pickle.loads(gzip.decompress(f.read()))
@@ -1,208 +1,419 @@
-import sys, json, os
+import sys, os
+import argparse
 import re
-from reddit_crawler.request import fetch, init_reddit_sessions, get_diverse_submissions
+from reddit_crawler.request import fetch, back_off, switch_account, RateLimited, init_reddit_sessions, SeedSource, LISTINGS, DEFAULT_MAX_RPM
+from reddit_crawler.frontier import Frontier, make_priority
+from reddit_crawler.writer import JsonlWriter
+from reddit_crawler.dedup import make_store, DiskDigestSet, BACKENDS
+from reddit_crawler import checkpoint
+from reddit_crawler.http_cache import ResponseCache
+from reddit_crawler.record import Post, Comment
+from reddit_crawler import metrics
 import praw
+from prawcore.exceptions import TooManyRequests
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 count = 0
 name = "data"
 output_dir = "data_files"
-firstfile = True
-processed_ids = set()
+output_format = "jsonl"  # or "json" for the legacy one-array-per-file layout
+output_compression = None  # "gzip" or "zstd" for compressed shards (data0.jsonl.gz, ...)
+rotate_on = "uncompressed"  # shard size limit applies to the uncompressed or the compressed bytes
+writer = None
+processed_ids = set()  # replaced by a compact/bloom/disk store with --dedup
+_write_lock = threading.Lock()  # data_clean/write_json are shared by concurrent workers
+subreddit_home = None
+seed_source = None  # SeedSource for subreddit_home, refills the frontier when it runs low
+crawl_priority = "shortest"
+checkpoint_path = None  # set to periodically snapshot the crawl so it can be resumed
+checkpoint_every = 100  # posts between checkpoints
+more_limit = 10  # most MoreComments expanded per post, each one is an API request
+comment_limit = 100  # comments stored per post
+
+URL_RE = re.compile(r'https?://\S+')
+TRAILING_RE = re.compile(r'[)\]}]$')
 
 if not os.path.exists(output_dir):
     os.makedirs(output_dir)
 
-def data_clean(response):
-    global processed_ids
-
-    # Check if the post ID is already processed
-    if response.id in processed_ids:
-        return 
+def extract_links(text, urls):
+    # Add the Reddit URLs found in `text` to `urls`
+    if 'reddit.com' not in text:  # most comments have no links, skip the regex
+        return
+    for url in URL_RE.findall(text):
+        if 'reddit.com' in url:
+            # Clean URL by removing any trailing characters 
+            urls.add(TRAILING_RE.sub('', url))
 
-    processed_ids.add(response.id)
+def plan_expansion(more_comments, budget, needed):
+    # How many MoreComments to expand. praw expands the ones hiding the most comments
+    # first, so take them in that order until their expected yield (at most 100
+    # comments per request) covers the `needed` comments or the budget runs out.
+    requests = expected = 0
+    for count in sorted((min(more.count, 100) for more in more_comments), reverse=True):
+        if expected >= needed or requests >= budget or count == 0:
+            break
+        expected += count
+        requests += 1
+    return requests
 
-    # Try to expand all comment trees to get more comments
+def expand_thread(response):
+    # Expand the comment tree once and walk it once, collecting both the comments
+    # we store and the links we crawl next. Only as many MoreComments are expanded
+    # (one API request each, at most more_limit) as it takes to fill comment_limit.
+    loaded = response.comments.list()
+    more_comments = [item for item in loaded if not hasattr(item, "body")]
+    stats = {"loaded": len(loaded) - len(more_comments)}
+    stats["requests"] = plan_expansion(more_comments, more_limit, comment_limit - stats["loaded"])
     try:
-        response.comments.replace_more(limit=10)  # Expand comment trees
+        with metrics.timer("replace_more_seconds"):
+            response.comments.replace_more(limit=stats["requests"])  # Expand comment trees
+    except TooManyRequests:
+        raise  # crawl_url backs off and retries the whole post
     except Exception as e:
         print(f"Error expanding comments: {e}")
 
     comments = []
-    # Process more comments - up to 100 per post instead of just top level
-    comment_count = 0
+    urls = set()
+    total = 0
+    extract_links(response.selftext, urls)
+    # Process more comments - up to comment_limit per post instead of just top level
     for comment in response.comments.list():  # Use list() to get all comments
-        if hasattr(comment, "body") and comment_count < 100:
+        if not hasattr(comment, "body"):
+            continue
+        total += 1
+        extract_links(comment.body, urls)  # links are taken from every comment
+        if len(comments) < comment_limit:
             if hasattr(comment, "author") and comment.author is not None:
                 if comment.author.name != "[deleted]":
-                    comments.append(comment.author.name + ": " + comment.body)
-                    comment_count += 1
+                    comments.append(Comment(comment.author.name, comment.body))
             else:
-                comments.append("n/a: " + comment.body)
-                comment_count += 1
+                comments.append(Comment("n/a", comment.body))
+    stats["comments"] = total
+    stats["stored"] = len(comments)
+    metrics.incr("comments_stored_total", len(comments))
+    metrics.incr("more_requests_total", stats["requests"])
+    # Saved against what a fixed budget would have spent: replace_more(limit=more_limit)
+    # stops at more_limit, and a MoreComments with count 0 has nothing to load
+    expandable = sum(1 for more in more_comments if more.count > 0)
+    metrics.incr("more_requests_saved_total", min(more_limit, expandable) - stats["requests"])
+    return comments, urls, stats
+
+def data_clean(response):
+    # Store one submission and return the Reddit URLs found in it
+    global processed_ids
+
+    # Check if the post ID is already processed
+    # (it is only recorded together with the write below, so a checkpoint never
+    # contains a processed ID without its record)
+    if response.id in processed_ids:
+        return set()
+
+    comments, urls, stats = expand_thread(response)
+    print(f"Comments: stored {stats['stored']} of {stats['comments']} "
+          f"({stats['loaded']} loaded with the post, {stats['requests']} expansion requests)")
 
     if response.author is not None:
         name = response.author.name
     else:
         name = "n/a"
 
-    dictionary = {
-        "Post Title": response.title,
-        "Subreddit": response.subreddit.display_name,
-        "Selftext": response.selftext,
-        "Post ID": response.id,
-        "Post Date": response.created_utc,
-        "Post Score": response.score,
-        "URL": "https://www.reddit.com/" + response.permalink,
-        "Links": response.url,
-        "Username": name,
-        "Upvotes": response.ups,
-        "Comments": comments,
-    }
-    write_json(dictionary, False)
-
-
-#dictionary is a dictionary object and lastfile is a bool 
-#endfile is used to check for the last inputted value to the json file
-# to add closing ']' to the json file
+    post = Post(
+        id=response.id,
+        subreddit=response.subreddit.display_name,
+        title=response.title,
+        selftext=response.selftext,
+        author=name,
+        created_utc=response.created_utc,
+        score=response.score,
+        ups=response.ups,
+        permalink="https://www.reddit.com/" + response.permalink,
+        url=response.url,
+        comments=comments,
+    )
+    with _write_lock:
+        # Another worker got here first; add() is only False for a disk store shared
+        # with other processes (orchestrator), where it is the atomic claim
+        if response.id in processed_ids or processed_ids.add(response.id) is False:
+            return set()
+        write_json(post.to_display(), False)
+    return urls
+
+
+#dictionary is a dictionary object and endfile is a bool 
+#endfile closes the current output file (adds the closing ']' in json format)
+@metrics.timed("write_json_seconds")
 def write_json(dictionary, endfile):
-    global count, name, firstfile
-    file_path = os.path.join(output_dir, f"{name}{count}.json")
+    global count, writer
+    if writer is None:
+        # Created on first use so the starting file number set in __main__ is honoured
+        writer = JsonlWriter(output_dir, name, index=count, fmt=output_format,
+                             compression=output_compression, rotate_on=rotate_on)
 
     if endfile:
-        with open(file_path, "r+", encoding = 'utf-8') as outfile:
-            outfile.seek(0, 2)
-            size = outfile.tell()
-            outfile.seek(size - 1)
-            if outfile.read(1) == ',':
-                outfile.seek(size - 1)
-                outfile.truncate()
-            outfile.write(']')
-        return
-    
-    if firstfile:
-        with open(file_path, "w", encoding = 'utf-8') as outfile:
-            outfile.write('[')
-            json.dump(dictionary, outfile, ensure_ascii=False)
-            outfile.write(",")
-        firstfile = False
-
+        writer.close()
     else:
-        with open(file_path, "a", encoding = 'utf-8') as outfile:   
-            outfile.write("\n")
-            json.dump(dictionary, outfile, ensure_ascii=False)
-            outfile.flush()
-
-            filepath = os.path.join(output_dir, f"{name}{count}.json")
-            filesize = os.path.getsize(filepath)
-
-            # Exactly 10MB (10,485,760 bytes)
-            if filesize >= 10485760:
-                outfile.write("]")
-                outfile.close()
-                count += 1
-                firstfile = True
-            else:
-                outfile.write(",")
+        metrics.incr("bytes_written_total", writer.write(dictionary))
+        metrics.incr("posts_written_total")
+    count = writer.index
 				
-def parse(text):
-    urls = set()  # Initialize a set to store URLs
-    
-    # Find URLs in the selftext
-    all_urls = re.findall(r'(https?://\S+)', text.selftext)
-    
-    # Add URLs from comments
+def crawl_url(url, depth, frontier, max_rpm=DEFAULT_MAX_RPM, session=None):
+    # Fetch one submission, store it and queue the links found in its comments.
     try:
-        # Expand comment trees to get more URLs
-        text.comments.replace_more(limit=5)
-        
-        # Check comments for URLs
-        for comment in text.comments.list():  # Get all comments including replies
-            if hasattr(comment, "body"):
-                comment_urls = re.findall(r'(https?://\S+)', comment.body)
-                all_urls.extend(comment_urls)
+        text = fetch(url, max_rpm=max_rpm, session=session)
+        # Clean and save the data; the same pass returns the URLs to process next
+        new_urls = data_clean(text)
+        print(f"Found {len(new_urls)} new URLs")
+        for found_url in new_urls:
+            frontier.push(found_url, depth=depth + 1)
+        ok = True
+    except (TooManyRequests, RateLimited) as e:
+        # Nothing was stored for this post, so crawl it again later. fetch() already
+        # backed off on its own 429s; one hit while expanding comments still needs it.
+        print(f"⚠️ Rate-limited while processing {url}, retrying it later")
+        if isinstance(e, TooManyRequests):
+            back_off(session, e)
+            if session is None:
+                switch_account()
+        frontier.requeue(url)
+        metrics.incr("crawl_retries_total")
+        ok = False
     except Exception as e:
-        print(f"Error parsing comments for URLs: {e}")
-    
-    # Keep all Reddit URLs 
-    for url in all_urls:
-        if 'reddit.com' in url:
-            # Clean URL by removing any trailing characters 
-            clean_url = re.sub(r'[)\]}]$', '', url)
-            urls.add(clean_url)
-    
-    return urls
-    
-    return urls
+        print(f"⚠️ Error processing {url}: {e}")
+        ok = False
+        metrics.incr("crawl_errors_total")
+    metrics.maybe_report()
+    # Not reached on Ctrl-C, so an interrupted URL is still in flight and gets checkpointed
+    frontier.done(url)
+    return ok
 
-def crawl_thread(frontier, max_rpm=180, timeout=30):
-    global count, firstfile
+def save_crawl_checkpoint(frontier, initial_count):
+    # Atomically snapshot everything needed to continue this crawl with --resume.
+    if checkpoint_path is None:
+        return
+    with _write_lock:
+        if writer is not None:
+            writer.flush()
+        data = checkpoint.dumps({
+            "subreddit": subreddit_home,
+            "priority": crawl_priority,
+            "initial_count": initial_count,
+            "count": count,
+            "name": name,
+            "output_format": output_format,
+            "compression": output_compression,
+            "rotate_on": rotate_on,
+            "writer": writer.position() if writer is not None else None,
+            "processed_ids": processed_ids,
+            "frontier": frontier.snapshot(),
+            "seed_source": seed_source.state() if seed_source is not None else None,
+        })
+    checkpoint.save_checkpoint(checkpoint_path, data)
+    print(f"Checkpoint saved to {checkpoint_path}")
+
+def refill_frontier(frontier, source, n=500):
+    # Continue the seed listings where they stopped and queue up to n new submissions
+    print("Frontier running low. Getting more submissions...")
+    added = 0
+    try:
+        for submission in source.take(n):
+            seed_url = "https://www.reddit.com" + submission.permalink
+            added += frontier.push(seed_url, score=submission.score, subreddit=source.subreddit_name)
+        print(f"Added {added} more URLs to frontier")
+    except Exception as e:
+        print(f"Error getting more submissions: {e}")
+    return added
+
+def setup_crawl(subreddit, limit=1000, priority="shortest", fmt="jsonl", processed=None, visited=None):
+    # Reset the crawl state for a fresh crawl of `subreddit` and return its seeded frontier.
+    # Shards are named after the subreddit (AskReddit_data0.jsonl, ...), so crawls of
+    # different subreddits never write to the same files.
+    global subreddit_home, crawl_priority, output_format, processed_ids, name, count, writer, seed_source
+    subreddit_home = subreddit
+    crawl_priority = priority
+    output_format = fmt
+    processed_ids = processed if processed is not None else set()
+    name = f"{subreddit}_data"
+    count = 0
+    writer = None
+    frontier = Frontier(priority=make_priority(priority, home=subreddit), visited=visited)
+
+    print("Setup Crawler: Getting Subreddits")
+
+    # Seeds stream in: crawl as soon as the first listing page arrives, the
+    # rest of the listings are paged in whenever the frontier runs low
+    seed_source = SeedSource(subreddit, page_size=max(10, min(100, limit // len(LISTINGS))))
+    refill_frontier(frontier, seed_source, n=seed_source.page_size)
+    return frontier
+
+def run_crawl(frontier, sessions, concurrent=False, initial_count=None):
+    print("Crawling threads")
+    print(f"Collected {len(frontier)} seeds")
+    if concurrent and len(sessions) > 1:
+        crawl_concurrent(frontier, sessions, max_rpm=DEFAULT_MAX_RPM, initial_count=initial_count)
+    else:
+        crawl_thread(frontier, max_rpm=DEFAULT_MAX_RPM, initial_count=initial_count) # Start crawling threads
+
+def crawl_thread(frontier, max_rpm=DEFAULT_MAX_RPM, timeout=30, initial_count=None):
+    global count
     target_file_count = 10  # We want exactly 10 files
-    initial_count = count   # Remember where we started
+    if initial_count is None:
+        initial_count = count   # Remember where we started (a resumed crawl passes it in)
     processed_count = 0
     print(f"Starting crawl with {len(frontier)} seed URLs")
     
-    # Continue until we have 10 files or run out of URLs
-    while frontier and (count < initial_count + target_file_count):
-        # Keep track of where we are
-        current_file = count
-        remaining_files = (initial_count + target_file_count) - count
-        
-        # Get the URL to process (prioritize shorter URLs as they're more likely to be valid)
-        url_index = 0
-        shortest_len = float('inf')
-        for i, u in enumerate(frontier[:50]):  # Look at first 50 URLs
-            if len(u) < shortest_len and "/comments/" in u:
-                url_index = i
-                shortest_len = len(u)
-        
-        url = frontier.pop(url_index)  # Get the selected URL
-        
-        print(f"Processing URL {current_file}/{initial_count + target_file_count - 1} ({remaining_files} files to go): {url}")
-        
-        try:
-            # Add timeout to prevent getting stuck
-            text = fetch(url, max_rpm=max_rpm)
-            data_clean(text)  # Clean and save the data
-            processed_count += 1
+    try:
+        # Continue until we have 10 files or run out of URLs
+        while frontier and (count < initial_count + target_file_count):
+            # Keep track of where we are
+            current_file = count
+            remaining_files = (initial_count + target_file_count) - count
             
-            # Get more URLs to process
-            new_urls = parse(text)
-            print(f"Found {len(new_urls)} new URLs")
-            for found_url in new_urls:
-                if found_url not in frontier:
-                    frontier.append(found_url)
+            # Highest-priority URL (shortest by default); the frontier marks it visited
+            url, depth = frontier.pop()
             
-        except Exception as e:
-            print(f"⚠️ Error processing {url}: {e}")
-        
-        # Add a short sleep to avoid overwhelming the API
-        time.sleep(0.5)
-        
-        # If we're running low on frontier URLs and still need more files, try to get more
-        if len(frontier) < 100 and count < initial_count + target_file_count - 1:
-            print("Frontier running low. Getting more submissions...")
-            try:
-                more_submissions = get_diverse_submissions(subreddit_home, limit=500)
-                for submission in more_submissions:
-                    seed_url = "https://www.reddit.com" + submission.permalink
-                    if seed_url not in frontier:
-                        frontier.append(seed_url)
-                print(f"Added {len(more_submissions)} more URLs to frontier")
-            except Exception as e:
-                print(f"Error getting more submissions: {e}")
+            print(f"Processing URL {current_file}/{initial_count + target_file_count - 1} ({remaining_files} files to go): {url}")
+            
+            # Pacing is left to respect_rate inside fetch
+            if crawl_url(url, depth, frontier, max_rpm=max_rpm):
+                processed_count += 1
+                if processed_count % checkpoint_every == 0:
+                    save_crawl_checkpoint(frontier, initial_count)
+            
+            # If we're running low on frontier URLs and still need more files, try to get more
+            if len(frontier) < 100 and count < initial_count + target_file_count - 1:
+                refill_frontier(frontier, seed_source)
+    finally:
+        # Also runs on Ctrl-C or a crash
+        save_crawl_checkpoint(frontier, initial_count)
     
     print(f"Crawling complete. Generated files from {initial_count} to {count-1}")
     # Close the JSON file properly
     write_json({}, True)
 
+def crawl_concurrent(frontier, sessions, max_rpm=DEFAULT_MAX_RPM, initial_count=None):
+    # Same crawl as crawl_thread, but with one worker thread per Reddit session.
+    # Every worker drains the shared frontier under its own account's rate budget,
+    # so throughput grows with the number of configured accounts.
+    global count
+    target_file_count = 10
+    if initial_count is None:
+        initial_count = count
+    in_flight = [0]
+    processed_count = [0]
+    state_lock = threading.Lock()
+    refill_lock = threading.Lock()
+    stop = threading.Event()
+    print(f"Starting concurrent crawl with {len(frontier)} seed URLs and {len(sessions)} workers")
+
+    def finished():
+        return stop.is_set() or count >= initial_count + target_file_count
+
+    def worker(session):
+        while not finished():
+            with state_lock:
+                try:
+                    url, depth = frontier.pop()
+                    in_flight[0] += 1
+                except IndexError:
+                    url = None
+                    idle = in_flight[0] == 0
+            if url is None:
+                # Frontier is empty: other workers may still add links, otherwise refill or stop
+                if refill_lock.acquire(blocking=False):
+                    try:
+                        refill_frontier(frontier, seed_source)
+                    finally:
+                        refill_lock.release()
+                    if not frontier:
+                        if idle:
+                            return
+                        time.sleep(0.5)
+                else:
+                    time.sleep(0.1)
+                continue
+
+            print(f"[{session.config.username}] Processing URL {count}/{initial_count + target_file_count - 1}: {url}")
+            try:
+                ok = crawl_url(url, depth, frontier, max_rpm=max_rpm, session=session)
+            finally:
+                with state_lock:
+                    in_flight[0] -= 1
+            if ok:
+                with state_lock:
+                    processed_count[0] += 1
+                    due = processed_count[0] % checkpoint_every == 0
+                if due:
+                    save_crawl_checkpoint(frontier, initial_count)
+
+            # Only one worker tops up the frontier at a time; the others keep crawling
+            if len(frontier) < 100 and not finished() and refill_lock.acquire(blocking=False):
+                try:
+                    refill_frontier(frontier, seed_source)
+                finally:
+                    refill_lock.release()
+
+    pool = ThreadPoolExecutor(max_workers=len(sessions))
+    try:
+        for future in [pool.submit(worker, session) for session in sessions]:
+            future.result()
+    finally:
+        # On Ctrl-C let the workers finish their current URL, then snapshot
+        stop.set()
+        pool.shutdown(wait=True)
+        save_crawl_checkpoint(frontier, initial_count)
+
+    print(f"Crawling complete. Generated files from {initial_count} to {count-1}")
+    with _write_lock:
+        write_json({}, True)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("usage: python -m reddit_crawler.crawler <subreddit> [limit=1000]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(prog="python -m reddit_crawler.crawler")
+    parser.add_argument("subreddit", nargs="?")
+    parser.add_argument("limit", nargs="?", type=int, default=1000,
+                        help="seeds per round over the sort/time-filter listings (sets the page size); "
+                             "refills keep paging further rounds while the crawl needs URLs")
+    parser.add_argument("--priority", default="shortest", choices=["shortest", "affinity", "score", "depth"])
+    parser.add_argument("--format", default="jsonl", choices=["jsonl", "json"],
+                        help="output layout: one record per line, or the legacy JSON array per file")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="write compressed shards (one frame per flush)")
+    parser.add_argument("--rotate-on", default=rotate_on, choices=["uncompressed", "compressed"],
+                        help="which shard size the 10MB limit applies to")
+    parser.add_argument("--dedup", default="set", choices=BACKENDS,
+                        help="store for processed and visited submission IDs (compact/bloom/disk bound memory)")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="crawl with one worker thread per configured Reddit account")
+    parser.add_argument("--more-limit", type=int, default=more_limit,
+                        help="most MoreComments expansions (API requests) per post; fewer are used once "
+                             "the loaded comments fill the per-post quota")
+    parser.add_argument("--metrics", metavar="PATH", help="write run metrics to PATH (.json, or .prom for Prometheus text)")
+    parser.add_argument("--metrics-interval", type=float, metavar="SECONDS", help="print a metrics summary line every SECONDS")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: data_files/<subreddit>.checkpoint)")
+    parser.add_argument("--checkpoint-every", type=int, default=checkpoint_every, help="posts between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue the crawl saved in the checkpoint")
+    parser.add_argument("--http-cache", metavar="PATH",
+                        help="SQLite cache of submission/comment responses; cached posts cost no API requests")
+    parser.add_argument("--cache-max-age", type=float, default=7, metavar="DAYS", help="expire cached responses after DAYS")
+    parser.add_argument("--cache-max-mb", type=int, default=1024, help="evict least recently used responses beyond this size")
+    args = parser.parse_args()
+    if not args.subreddit and not (args.resume and args.checkpoint):
+        parser.error("a subreddit is required (or --resume --checkpoint <file>)")
+    checkpoint_path = args.checkpoint or os.path.join(output_dir, f"{args.subreddit}.checkpoint")
+    checkpoint_every = args.checkpoint_every
+    more_limit = args.more_limit
+    output_compression = args.compress
+    rotate_on = args.rotate_on
+    if args.metrics or args.metrics_interval:
+        metrics.enable(interval=args.metrics_interval, path=args.metrics)
     try:
         # Initialize Reddit sessions
-        reddit_sessions = init_reddit_sessions()
+        response_cache = None
+        if args.http_cache:
+            response_cache = ResponseCache(args.http_cache, max_age=args.cache_max_age * 86400,
+                                           max_bytes=args.cache_max_mb * 1024 * 1024)
+        reddit_sessions = init_reddit_sessions(cache=response_cache)
         if not reddit_sessions:
             print("Error: No Reddit sessions available. Check your environment variables.")
             sys.exit(1)
@@ -210,44 +421,50 @@ if __name__ == "__main__":
         # Use the first session for initial operations
         reddit = reddit_sessions[0]
 
-        global subreddit_home
-        subreddit_home = sys.argv[1]
-        seeds = [] # Initialize the seeds list
-
-        try:
-            limit = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
-        except ValueError:
-            print("Argument must be an integer")
-            sys.exit(1)
-
-        # Set the starting file count based on subreddit
-        if (subreddit_home == "AskReddit"):
-            count = 0
-        elif (subreddit_home == "AITAH"):
-            count = 10
-        elif (subreddit_home == "askscience"):
-            count = 20
-        elif (subreddit_home == "explainlikeimfive"):
-            count = 30   
-        elif (subreddit_home == "scarystories"):
-            count = 40
+        if args.resume:
+            # Pick up exactly where the checkpoint left off: same frontier, same
+            # processed IDs, same output file and byte offset
+            state = checkpoint.load_checkpoint(checkpoint_path)
+            subreddit_home = state["subreddit"]
+            crawl_priority = state["priority"]
+            name = state["name"]
+            output_format = state["output_format"]
+            output_compression = state.get("compression")
+            rotate_on = state.get("rotate_on", "uncompressed")
+            processed_ids = state["processed_ids"]
+            seeds = Frontier.restore(state["frontier"], make_priority(crawl_priority, home=subreddit_home))
+            # IDs committed to disk stores after the checkpoint belong to records the
+            # resumed writer truncates away; forget them so those posts are crawled again
+            for store in (processed_ids, seeds.visited):
+                if isinstance(store, DiskDigestSet):
+                    if store.shared:
+                        print(f"{store.path} is shared with other crawler processes, "
+                              f"keeping the IDs added since the checkpoint")
+                    else:
+                        store.rollback_to_checkpoint()
+            if state["writer"] is not None:
+                writer = JsonlWriter.resume(output_dir, state["writer"])
+                count = writer.index
+            else:
+                count = state["count"]
+            initial_count = state["initial_count"]
+            if state.get("seed_source"):
+                seed_source = SeedSource.from_state(state["seed_source"])
+            else:
+                seed_source = SeedSource(subreddit_home)
+            print(f"Resuming r/{subreddit_home} from {checkpoint_path}: {len(seeds)} URLs queued, file {count}")
         else:
-            # Default to 0 for any other subreddit
-            count = 0
-
-        print("Setup Crawler: Getting Subreddits")
-
-        # Get diverse submissions using our enhanced function
-        submissions = get_diverse_submissions(subreddit_home, limit=limit)
-        
-        for submission in submissions:
-            seed_url = "https://www.reddit.com" + submission.permalink
-            if seed_url not in seeds:  # Avoid duplicates
-                seeds.append(seed_url)
+            processed = make_store(args.dedup, path=os.path.join(output_dir, "processed_ids.sqlite"))
+            visited_ids = make_store(args.dedup, path=os.path.join(output_dir, "visited_ids.sqlite"))
+            seeds = setup_crawl(args.subreddit, args.limit, priority=args.priority, fmt=args.format,
+                                processed=processed, visited=visited_ids)
+            initial_count = count
 
-        print("Crawling threads")
-        print(f"Collected {len(seeds)} seeds")
-        crawl_thread(seeds, max_rpm=180) # Start crawling threads
+        run_crawl(seeds, reddit_sessions, concurrent=args.concurrent, initial_count=initial_count)
         
     except KeyboardInterrupt:
-        print("\n⏹  stopped by user")
\ No newline at end of file
+        print("\n⏹  stopped by user (resume with --resume)")
+    finally:
+        if metrics.enabled:
+            print(metrics.summary_line())
+            metrics.dump()
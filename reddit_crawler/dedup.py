@@ -0,0 +1,230 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Optional
+
+# Memory-bounded "have we seen this?" stores for the cleaner's content hashes and
+# the crawler's submission IDs.
+#
+# Every store supports `key in store` and `store.add(key)`, like a set, so they can
+# be dropped in where a set was used. Keys may be strings (hashed with md5 first) or
+# bytes digests of at least 16 bytes (used as they are).
+#
+#   set      plain Python set, exact, ~100+ bytes per entry
+#   compact  exact, 8-byte digests in an open-addressing table, ~12-24 bytes per entry
+#   bloom    approximate (false positives at `error_rate`), ~1.2-2 bytes per entry
+#   disk     exact, SQLite file on disk, only the page cache stays in memory
+
+BACKENDS = ("set", "compact", "bloom", "disk")
+
+
+def digest(key) -> bytes:
+    if isinstance(key, bytes) and len(key) >= 16:
+        return key
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    return hashlib.md5(key).digest()
+
+
+class CompactDigestSet:
+    # Open-addressing hash table (linear probing) of 64-bit digest prefixes in one array.
+
+    def __init__(self, capacity: int = 1 << 16):
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._used = 0
+
+    def __len__(self):
+        return self._used
+
+    @staticmethod
+    def _value(key) -> int:
+        return int.from_bytes(digest(key)[:8], "little") or 1  # 0 marks an empty slot
+
+    def _slot(self, value: int) -> int:
+        table, mask = self._table, self._mask
+        i = value & mask
+        while table[i] and table[i] != value:
+            i = (i + 1) & mask
+        return i
+
+    def __contains__(self, key) -> bool:
+        value = self._value(key)
+        return self._table[self._slot(value)] == value
+
+    def add(self, key) -> bool:
+        # Returns True if the key was new.
+        value = self._value(key)
+        i = self._slot(value)
+        if self._table[i] == value:
+            return False
+        self._table[i] = value
+        self._used += 1
+        if self._used * 10 > len(self._table) * 7:  # keep the load factor under 0.7
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self._table
+        self._table = array("Q", bytes(16 * len(old)))
+        self._mask = len(self._table) - 1
+        for value in old:
+            if value:
+                self._table[self._slot(value)] = value
+
+
+class BloomFilter:
+    # Bit array with k probes per key (double hashing over the md5 digest).
+    # A key never added can be reported as seen with probability ~error_rate once
+    # `capacity` keys are in; added keys are always found.
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bits_count = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self._probes = max(1, round(self._bits_count / capacity * math.log(2)))
+        self._bits = bytearray((self._bits_count + 7) // 8)
+        self._added = 0
+
+    def __len__(self):
+        return self._added
+
+    def _positions(self, key):
+        d = digest(key)
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:16], "little") | 1
+        m = self._bits_count
+        return [(h1 + i * h2) % m for i in range(self._probes)]
+
+    def __contains__(self, key) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key) -> bool:
+        # Returns True if the key was (probably) new.
+        bits = self._bits
+        new = False
+        for p in self._positions(key):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                new = True
+        self._added += new
+        return new
+
+
+class DiskDigestSet:
+    # 16-byte digests in a SQLite table. Inserts are committed every `commit_every`
+    # adds; commit_every=1 makes each add visible to other processes right away.
+    #
+    # Pickling (crawl checkpoints) records the last rowid, and rollback_to_checkpoint()
+    # on the unpickled store deletes every row added after it: commits do not wait for
+    # checkpoints, so after a crash the file can hold IDs whose records the resumed crawl
+    # truncates away again. A `shared` store is written by other processes too (the
+    # orchestrator's workers), so it is never rolled back.
+
+    def __init__(self, path: str, reset: bool = False, commit_every: int = 1000, shared: bool = False):
+        self.path = path
+        self.commit_every = commit_every
+        self.shared = shared
+        self.checkpoint_rows = None  # rows when the checkpoint this store was unpickled from was taken
+        self._pending = 0
+        self._lock = threading.Lock()
+        if reset and os.path.exists(path):
+            os.remove(path)
+        self._connect()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS seen (d BLOB PRIMARY KEY)")  # rowid = insertion order
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM seen WHERE d = ?", (digest(key)[:16],)).fetchone() is not None
+
+    def add(self, key) -> bool:
+        # Returns True if the key was new. Atomic across processes sharing the file.
+        with self._lock:
+            cursor = self._db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (digest(key)[:16],))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._db.commit()
+                self._pending = 0
+            return cursor.rowcount == 1
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def rollback(self):
+        # Forget every add since the last commit
+        with self._lock:
+            self._db.rollback()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def rows(self) -> Optional[int]:
+        # Last rowid, the mark rollback_to_checkpoint() goes back to; commit() first
+        with self._lock:
+            try:
+                return self._db.execute("SELECT COALESCE(MAX(rowid), 0) FROM seen").fetchone()[0]
+            except sqlite3.OperationalError:
+                return None  # WITHOUT ROWID table from an older version, cannot be rolled back
+
+    def __getstate__(self):
+        # Pickles as a reference to the file plus how many rows it had (crawl checkpoints)
+        self.commit()
+        return {"path": self.path, "commit_every": self.commit_every, "shared": self.shared, "rows": self.rows()}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.commit_every = state["commit_every"]
+        self.shared = state.get("shared", False)
+        self.checkpoint_rows = state.get("rows")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._connect()
+
+    def rollback_to_checkpoint(self) -> int:
+        # Forget the IDs committed after the checkpoint this store was unpickled from;
+        # returns how many were removed
+        if self.shared:
+            raise ValueError(f"{self.path} is shared with other processes, its IDs cannot be rolled back")
+        if self.checkpoint_rows is None:
+            return 0
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM seen WHERE rowid > ?", (self.checkpoint_rows,))
+            self._db.commit()
+            return cursor.rowcount
+
+
+def make_store(kind: str = "set", path: str = None, capacity: int = 1 << 16, error_rate: float = 0.001,
+               reset: bool = True):
+    # Build a dedup store by backend name; `path` is only used by "disk".
+    if kind == "set":
+        return set()
+    if kind == "compact":
+        return CompactDigestSet(capacity)
+    if kind == "bloom":
+        return BloomFilter(max(capacity, 10_000_000), error_rate)
+    if kind == "disk":
+        if path is None:
+            raise ValueError("the disk dedup store needs a path")
+        return DiskDigestSet(path, reset=reset)
+    raise ValueError(f"Unknown dedup backend: {kind} (expected one of {', '.join(BACKENDS)})")
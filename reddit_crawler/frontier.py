@@ -0,0 +1,160 @@
+import heapq
+import pickle
+import re
+import threading
+from itertools import count as _counter
+from typing import Optional
+
+# Matches the submission ID in any of the URL shapes we find in posts and comments:
+#   https://www.reddit.com/r/AskReddit/comments/abc123/some_title/
+#   https://old.reddit.com/comments/abc123
+#   https://redd.it/abc123
+_COMMENTS_RE = re.compile(r"/comments/([a-z0-9]{2,10})(?:[/?#]|$)", re.IGNORECASE)
+_SHORTLINK_RE = re.compile(r"^https?://(?:www\.)?redd\.it/([a-z0-9]{2,10})(?:[/?#]|$)", re.IGNORECASE)
+_SUBREDDIT_RE = re.compile(r"/r/([A-Za-z0-9_]+)/", re.IGNORECASE)
+
+
+def submission_id(url: str) -> Optional[str]:
+    # Return the canonical (lowercase) submission ID for a reddit URL, or None
+    # if the URL does not point at a submission.
+    match = _COMMENTS_RE.search(url) or _SHORTLINK_RE.match(url)
+    if match is None:
+        return None
+    return match.group(1).lower()
+
+
+def subreddit_of(url: str) -> Optional[str]:
+    match = _SUBREDDIT_RE.search(url)
+    return match.group(1) if match else None
+
+
+# Priority functions map a frontier entry to a sort key; smaller keys are popped first.
+# An entry is the tuple (url, depth, score, subreddit), where url is the link as it was
+# found, so "shortest" still ranks the URLs themselves and not their submission IDs.
+
+def shortest_url(entry):
+    # Same heuristic the crawler always used: shorter URLs are more likely to be valid.
+    return len(entry[0])
+
+
+def by_score(entry):
+    return -entry[2]
+
+
+def by_depth(entry):
+    # Breadth-first: seeds (depth 0) before links discovered inside their comments.
+    return entry[1]
+
+
+def subreddit_affinity(home: str):
+    # Prefer posts in the home subreddit, then fall back to the shortest URL.
+    home = home.lower()
+
+    def key(entry):
+        subreddit = entry[3]
+        return (0 if subreddit and subreddit.lower() == home else 1, len(entry[0]))
+    return key
+
+
+PRIORITIES = {
+    "shortest": shortest_url,
+    "score": by_score,
+    "depth": by_depth,
+}
+
+
+def make_priority(name: str, home: Optional[str] = None):
+    if name == "affinity":
+        return subreddit_affinity(home or "")
+    try:
+        return PRIORITIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown frontier priority: {name}") from None
+
+
+class Frontier:
+    # Priority queue of submissions still to crawl.
+    #
+    # URLs are keyed by submission ID, so membership checks (queued or already
+    # visited) are O(1) set lookups and push/pop are O(log n) no matter how large
+    # the frontier grows. The first URL seen for a submission is the one queued.
+
+    def __init__(self, priority=shortest_url, visited=None):
+        self.priority = priority
+        self._heap = []
+        self._queued = set()
+        self._visited = visited if visited is not None else set()
+        self._in_flight = {}  # popped but not finished yet; requeued by snapshot()
+        self._seq = _counter()
+        self._lock = threading.Lock()
+
+    @property
+    def visited(self):
+        # The visited-ID store: a set or one of the dedup stores
+        return self._visited
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __bool__(self):
+        return bool(self._heap)
+
+    def __contains__(self, url):
+        sid = submission_id(url)
+        return sid is not None and (sid in self._queued or sid in self._visited)
+
+    def push(self, url: str, depth: int = 0, score: int = 0, subreddit: Optional[str] = None) -> bool:
+        # Queue `url` unless it is not a submission or was already seen. Returns True if queued.
+        sid = submission_id(url)
+        if sid is None:
+            return False
+        with self._lock:
+            if sid in self._queued or sid in self._visited:
+                return False
+            if subreddit is None:
+                subreddit = subreddit_of(url)
+            entry = (url, depth, score, subreddit)
+            heapq.heappush(self._heap, (self.priority(entry), next(self._seq), sid, entry))
+            self._queued.add(sid)
+        return True
+
+    def pop(self):
+        # Return the next (url, depth) and mark it visited; raises IndexError when empty.
+        # Call done(url) once it has been processed.
+        with self._lock:
+            _, _, sid, entry = heapq.heappop(self._heap)
+            self._queued.discard(sid)
+            self._visited.add(sid)
+            self._in_flight[sid] = entry
+        return entry[0], entry[1]
+
+    def requeue(self, url: str):
+        # Put a popped URL back in the queue, e.g. after a 429, so it is crawled again later.
+        sid = submission_id(url)
+        with self._lock:
+            entry = self._in_flight.pop(sid, None)
+            if entry is None or sid in self._queued:
+                return
+            heapq.heappush(self._heap, (self.priority(entry), next(self._seq), sid, entry))
+            self._queued.add(sid)
+
+    def done(self, url: str):
+        with self._lock:
+            self._in_flight.pop(submission_id(url), None)
+
+    def snapshot(self) -> dict:
+        # Picklable copy of the queue for checkpoints. URLs that were popped but never
+        # finished (e.g. interrupted by Ctrl-C) go back in the queue.
+        with self._lock:
+            entries = [item[3] for item in self._heap] + list(self._in_flight.values())
+            return {"entries": entries, "visited": pickle.dumps(self._visited, protocol=pickle.HIGHEST_PROTOCOL)}
+
+    @classmethod
+    def restore(cls, state: dict, priority=shortest_url):
+        frontier = cls(priority, visited=pickle.loads(state["visited"]))
+        for entry in state["entries"]:
+            sid = submission_id(entry[0])
+            if sid not in frontier._queued:
+                heapq.heappush(frontier._heap, (priority(entry), next(frontier._seq), sid, entry))
+                frontier._queued.add(sid)
+        return frontier
@@ -0,0 +1,155 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from prawcore import Requestor
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from reddit_crawler import metrics
+
+# On-disk cache of Reddit API responses, plugged in underneath PRAW as its requestor.
+#
+# Submission pages (/comments/<id>), MoreComments expansions (/api/morechildren) and
+# /api/info lookups are stored in SQLite, keyed by endpoint + query and tagged with the
+# submission ID. A cache hit never reaches the network, so re-crawling threads we already
+# have costs no API budget. Entries expire after `max_age` seconds and the least recently
+# used ones are evicted once the cache grows past `max_bytes`. Listings (hot/new/top...)
+# are never cached, seeds always come fresh.
+
+_COMMENTS_PATH = re.compile(r"/comments/([a-z0-9]+)", re.IGNORECASE)
+_ENDPOINTS = (("/api/morechildren", "morechildren"), ("/api/info", "info"))
+
+
+def classify(url: str, params) -> tuple:
+    # (endpoint, submission id) for cacheable URLs, (None, None) otherwise
+    path = urlsplit(url).path
+    for prefix, endpoint in _ENDPOINTS:
+        if path.startswith(prefix):
+            link_id = (params or {}).get("link_id", "")
+            return endpoint, link_id[3:] if link_id.startswith("t3_") else None
+    match = _COMMENTS_PATH.search(path)
+    if match:
+        return "comments", match.group(1).lower()
+    return None, None
+
+
+class ResponseCache:
+    def __init__(self, path: str, max_age: float = 7 * 86400, max_bytes: int = 1 << 30):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, submission_id TEXT, endpoint TEXT, status INTEGER,
+            headers TEXT, body BLOB, stored REAL, accessed REAL, size INTEGER)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_submission ON responses (submission_id)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(method: str, url: str, params) -> str:
+        query = urlencode(sorted((params or {}).items()))
+        return f"{method.upper()} {url}?{query}"
+
+    def get(self, key: str):
+        # (status, headers, body) or None if missing or expired
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT status, headers, body, stored FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[3] > self.max_age:
+                self._delete([key])
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row[0], json.loads(row[1]), row[2]
+
+    def put(self, key: str, endpoint: str, submission_id, status: int, headers: dict, body: bytes):
+        now = time.time()
+        with self._lock:
+            self._delete([key])
+            self._db.execute("INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (key, submission_id, endpoint, status, json.dumps(headers), body, now, now, len(body)))
+            self._total_bytes += len(body)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def has_submission(self, submission_id: str) -> bool:
+        # True if the submission page itself is cached and fresh, i.e. fetching it is free
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM responses WHERE submission_id = ? AND endpoint = 'comments' "
+                                   "AND stored >= ? LIMIT 1", (submission_id, time.time() - self.max_age)).fetchone()
+        return row is not None
+
+    def _delete(self, keys):
+        for key in keys:
+            row = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+
+    def _evict(self):
+        # Least recently used first, down to 90% of max_bytes so we don't evict on every put
+        target = self.max_bytes * 0.9
+        while self._total_bytes > target:
+            rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+class CachingRequestor(Requestor):
+    # prawcore Requestor that answers cacheable GETs from a ResponseCache.
+    # Use with praw.Reddit(requestor_class=CachingRequestor, requestor_kwargs={"cache": cache}).
+
+    def __init__(self, *args, cache: ResponseCache = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+
+    def request(self, *args, timeout=None, **kwargs):
+        method, url = args[0], args[1]
+        params = kwargs.get("params")
+        endpoint, submission_id = classify(url, params) if method.upper() == "GET" else (None, None)
+        if self.cache is None or endpoint is None:
+            return super().request(*args, timeout=timeout, **kwargs)
+
+        key = self.cache.key(method, url, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.incr("http_cache_hits_total")
+            status, headers, body = cached
+            response = Response()
+            response.status_code = status
+            # No x-ratelimit headers: prawcore counts a hit like one request at most
+            response.headers = CaseInsensitiveDict(headers)
+            response._content = body
+            response.url = url
+            response.encoding = "utf-8"
+            return response
+
+        metrics.incr("http_cache_misses_total")
+        response = super().request(*args, timeout=timeout, **kwargs)
+        if response.status_code == 200:
+            headers = {"content-type": response.headers.get("content-type", "application/json")}
+            self.cache.put(key, endpoint, submission_id, response.status_code, headers, response.content)
+        return response
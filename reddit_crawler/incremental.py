@@ -0,0 +1,335 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+from reddit_crawler import crawler, metrics
+from reddit_crawler.checkpoint import save_checkpoint
+from reddit_crawler.crawler import plan_expansion
+from reddit_crawler.record import Post, Comment
+from reddit_crawler.request import fetch, fetch_info, init_reddit_sessions, SeedSource
+from reddit_crawler.writer import JsonlWriter
+
+# Incremental refresh of subreddits that were crawled before:
+#
+#   python -m reddit_crawler.incremental AskReddit AITAH --refresh-days 2
+#
+# Every subreddit keeps a high-water mark in <output_dir>/<subreddit>.state.json: the
+# newest created_utc seen (plus the IDs posted at exactly that second, to break ties).
+# A run pages r/<subreddit>/new only until it reaches the mark, so it costs one listing
+# request per 100 new posts instead of a full crawl. At most `max_posts` are stored per
+# run, oldest first; newer ones wait for the next run rather than being skipped.
+#
+# Threads younger than `refresh_days` are also re-checked. Their current comment counts
+# come from /api/info (100 threads per request) and only threads that gained comments
+# are fetched again, sorted by new, with just enough MoreComments expanded to cover the
+# comments added since. Each thread keeps its own mark, so a comment is written once.
+#
+# Output is partitioned by the UTC day items were created on:
+#
+#   <output_dir>/<subreddit>/2026-10-18/posts0.jsonl      new posts with their comments
+#   <output_dir>/<subreddit>/2026-10-18/comments0.jsonl   comments added to known threads
+#
+# Later runs append new shards (posts1.jsonl, ...) to a day instead of rewriting it.
+# The state is saved after the output is flushed, so an interrupted run is simply
+# repeated from the previous marks.
+
+output_dir = os.path.join(crawler.output_dir, "incremental")
+refresh_days = 2  # threads younger than this are checked for new comments
+initial_posts = 100  # newest posts taken from a subreddit without a state file
+max_posts = 1000  # most new posts per run (the /new listing stops around 1000 anyway)
+compression = None
+save_every = 50  # threads between state saves
+
+
+def state_path(subreddit: str) -> str:
+    return os.path.join(output_dir, f"{subreddit}.state.json")
+
+
+def load_state(subreddit: str) -> dict:
+    try:
+        with open(state_path(subreddit)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"subreddit": subreddit, "high_water": None, "high_water_ids": [], "threads": {}}
+
+
+def save_state(state: dict):
+    os.makedirs(output_dir, exist_ok=True)
+    save_checkpoint(state_path(state["subreddit"]), json.dumps(state).encode("utf-8"))
+
+
+def is_newer(created_utc, item_id, mark, mark_ids) -> bool:
+    return mark is None or created_utc > mark or (created_utc == mark and item_id not in mark_ids)
+
+
+def advance(mark, mark_ids, created_utc, item_id):
+    # New (mark, mark_ids) after seeing one item
+    if mark is None or created_utc > mark:
+        return created_utc, [item_id]
+    if created_utc == mark and item_id not in mark_ids:
+        return mark, mark_ids + [item_id]
+    return mark, mark_ids
+
+
+def day_of(created_utc) -> str:
+    return datetime.fromtimestamp(created_utc, timezone.utc).strftime("%Y-%m-%d")
+
+
+def next_index(directory: str, kind: str) -> int:
+    # First shard number not used by an earlier run for the same day
+    pattern = re.compile(rf"{kind}(\d+)\.jsonl")
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    taken = [int(match.group(1)) for match in map(pattern.match, names) if match]
+    return max(taken) + 1 if taken else 0
+
+
+class PartitionedOutput:
+    # One JsonlWriter per (day, kind), opened on first use
+
+    def __init__(self, subreddit: str, compression=None):
+        self.root = os.path.join(output_dir, subreddit)
+        self.compression = compression
+        self._writers = {}
+
+    def write(self, kind: str, created_utc, record: dict):
+        day = day_of(created_utc)
+        writer = self._writers.get((day, kind))
+        if writer is None:
+            directory = os.path.join(self.root, day)
+            writer = JsonlWriter(directory, kind, index=next_index(directory, kind), compression=self.compression)
+            self._writers[(day, kind)] = writer
+        metrics.incr("bytes_written_total", writer.write(record))
+
+    def flush(self):
+        for writer in self._writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+def new_submissions(state: dict, limit: int) -> list:
+    # Submissions past the high-water mark, oldest first, at most `limit`. /new is newest
+    # first, so paging stops at the first submission we already have. When more than
+    # `limit` are new, the oldest ones are returned and the rest are left to the next
+    # run: the mark only ever moves over posts that were stored. Without a mark (first
+    # run) the newest `limit` are taken.
+    mark, mark_ids = state["high_water"], set(state["high_water_ids"])
+    page_size = 100 if mark is not None else min(100, limit)
+    source = SeedSource(state["subreddit"], page_size=page_size, listings=[("new", None)])
+    fresh = []
+    reached = mark is None
+    for submission in source.stream():
+        if not is_newer(submission.created_utc, submission.id, mark, mark_ids):
+            reached = True
+            break
+        fresh.append(submission)
+        if mark is None and len(fresh) >= limit:
+            break
+    if not reached:
+        # /new only goes back about 1000 posts; older ones can no longer be reached from it
+        oldest = fresh[-1].created_utc if fresh else None
+        print(f"⚠️ r/{state['subreddit']}: /new ended before the high-water mark, "
+              f"posts created between {mark} and {oldest} are missing")
+        metrics.incr("incremental_gaps_total")
+    fresh.reverse()
+    if len(fresh) > limit:
+        print(f"r/{state['subreddit']}: {len(fresh)} new posts, storing the oldest {limit}, the rest next run")
+        metrics.incr("posts_deferred_total", len(fresh) - limit)
+    return fresh[:limit]
+
+
+def new_comments(submission, mark, mark_ids, expected: int) -> list:
+    # Comments of a (comment_sort="new") submission past the thread's mark, oldest
+    # first and at most comment_limit. `expected` is how many comments the thread gained
+    # since the mark; MoreComments are expanded only to cover the ones that did not load
+    # with the page. Keeping the oldest means the mark, moved over what was returned,
+    # never passes a comment that was left out; the rest come with the next run.
+    wanted = min(expected, crawler.comment_limit)
+    loaded = submission.comments.list()
+    more_comments = [item for item in loaded if not hasattr(item, "body")]
+    fresh = sum(1 for c in loaded if hasattr(c, "body") and is_newer(c.created_utc, c.id, mark, mark_ids))
+    requests = plan_expansion(more_comments, crawler.more_limit, wanted - fresh)
+    if requests:
+        try:
+            with metrics.timer("replace_more_seconds"):
+                submission.comments.replace_more(limit=requests)
+        except Exception as e:
+            print(f"Error expanding comments: {e}")
+        metrics.incr("more_requests_total", requests)
+
+    comments = [c for c in submission.comments.list()
+                if hasattr(c, "body") and is_newer(c.created_utc, c.id, mark, mark_ids)]
+    comments.sort(key=lambda c: c.created_utc)
+    return comments[:crawler.comment_limit]
+
+
+def comments_seen(known_count: int, stored: int, num_comments: int) -> int:
+    # The num_comments to remember for a thread. If new_comments() hit comment_limit
+    # there may be more past the new mark, so count only what was taken and the thread
+    # shows up as changed on the next run.
+    return known_count + stored if stored >= crawler.comment_limit else num_comments
+
+
+def author_name(item) -> str:
+    return item.author.name if getattr(item, "author", None) is not None else "n/a"
+
+
+def comment_record(submission_id: str, comment) -> dict:
+    return {
+        "Post ID": submission_id,
+        "Comment ID": comment.id,
+        "Parent ID": getattr(comment, "parent_id", None),
+        "Username": author_name(comment),
+        "Body": comment.body,
+        "Comment Date": comment.created_utc,
+        "Score": getattr(comment, "score", None),
+    }
+
+
+def load_thread(submission):
+    # Fetch the thread page with its newest comments first
+    return fetch("https://www.reddit.com" + submission.permalink, comment_sort="new")
+
+
+def store_new_post(state: dict, output: PartitionedOutput, submission):
+    thread = load_thread(submission)
+    comments = new_comments(thread, None, [], submission.num_comments)
+    post = Post(
+        id=submission.id,
+        subreddit=submission.subreddit.display_name,
+        title=submission.title,
+        selftext=submission.selftext,
+        author=author_name(submission),
+        created_utc=submission.created_utc,
+        score=submission.score,
+        ups=submission.ups,
+        permalink="https://www.reddit.com/" + submission.permalink,
+        url=submission.url,
+        comments=[Comment(author_name(c), c.body) for c in reversed(comments) if author_name(c) != "[deleted]"],
+    )
+    output.write("posts", submission.created_utc, post.to_display())
+    metrics.incr("posts_written_total")
+    metrics.incr("comments_stored_total", len(post.comments))
+
+    mark, mark_ids = None, []
+    for comment in comments:
+        mark, mark_ids = advance(mark, mark_ids, comment.created_utc, comment.id)
+    state["threads"][submission.id] = {"created_utc": submission.created_utc,
+                                       "num_comments": comments_seen(0, len(comments), submission.num_comments),
+                                       "mark": mark, "mark_ids": mark_ids}
+    state["high_water"], state["high_water_ids"] = advance(state["high_water"], state["high_water_ids"],
+                                                           submission.created_utc, submission.id)
+
+
+def refresh_thread(state: dict, output: PartitionedOutput, submission) -> int:
+    known = state["threads"][submission.id]
+    thread = load_thread(submission)
+    comments = new_comments(thread, known["mark"], known["mark_ids"],
+                            submission.num_comments - known["num_comments"])
+    mark, mark_ids = known["mark"], known["mark_ids"]
+    for comment in comments:  # oldest first
+        output.write("comments", comment.created_utc, comment_record(submission.id, comment))
+        mark, mark_ids = advance(mark, mark_ids, comment.created_utc, comment.id)
+    metrics.incr("comments_stored_total", len(comments))
+    known.update(num_comments=comments_seen(known["num_comments"], len(comments), submission.num_comments),
+                 mark=mark, mark_ids=mark_ids)
+    return len(comments)
+
+
+def checkpoint_state(state: dict, output: PartitionedOutput):
+    output.flush()
+    save_state(state)
+
+
+def refresh_subreddit(subreddit: str):
+    state = load_state(subreddit)
+    output = PartitionedOutput(subreddit, compression=compression)
+    started = time.time()
+    try:
+        # Forget threads that left the refresh window
+        cutoff = started - refresh_days * 86400
+        state["threads"] = {sid: t for sid, t in state["threads"].items() if t["created_utc"] >= cutoff}
+        known = list(state["threads"])
+
+        limit = max_posts if state["high_water"] is not None else initial_posts
+        fresh = new_submissions(state, limit)
+        print(f"r/{subreddit}: {len(fresh)} new posts")
+        for done, submission in enumerate(fresh, 1):
+            try:
+                store_new_post(state, output, submission)
+            except Exception as e:
+                print(f"⚠️ Error storing {submission.id}: {e}")
+                metrics.incr("crawl_errors_total")
+                break  # keep the high-water mark below the post we could not store
+            if done % save_every == 0:
+                checkpoint_state(state, output)
+            metrics.maybe_report()
+
+        # Threads from earlier runs that gained comments since
+        changed = [s for s in fetch_info([f"t3_{sid}" for sid in known])
+                   if s.id in state["threads"] and s.num_comments > state["threads"][s.id]["num_comments"]]
+        print(f"r/{subreddit}: {len(changed)} of {len(known)} recent threads have new comments")
+        metrics.incr("threads_unchanged_total", len(known) - len(changed))
+        comments = 0
+        for done, submission in enumerate(changed, 1):
+            try:
+                comments += refresh_thread(state, output, submission)
+            except Exception as e:
+                print(f"⚠️ Error refreshing {submission.id}: {e}")
+                metrics.incr("crawl_errors_total")
+            metrics.incr("threads_refreshed_total")
+            if done % save_every == 0:
+                checkpoint_state(state, output)
+            metrics.maybe_report()
+        print(f"r/{subreddit}: {comments} new comments in {time.time() - started:.0f}s")
+    finally:
+        # Also on Ctrl-C: everything written so far is covered by the saved marks
+        checkpoint_state(state, output)
+        output.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m reddit_crawler.incremental")
+    parser.add_argument("subreddits", nargs="+")
+    parser.add_argument("--refresh-days", type=float, default=refresh_days,
+                        help="re-check threads younger than this for new comments")
+    parser.add_argument("--initial", type=int, default=initial_posts,
+                        help="newest posts to take from a subreddit on its first run")
+    parser.add_argument("--max-posts", type=int, default=max_posts, help="most new posts per subreddit and run")
+    parser.add_argument("--output-dir", default=output_dir, help="state files and date-partitioned output")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="write compressed shards")
+    parser.add_argument("--more-limit", type=int, default=crawler.more_limit,
+                        help="most MoreComments expansions (API requests) per thread")
+    parser.add_argument("--metrics", metavar="PATH", help="write run metrics to PATH (.json, or .prom for Prometheus text)")
+    parser.add_argument("--metrics-interval", type=float, metavar="SECONDS", help="print a metrics summary line every SECONDS")
+    args = parser.parse_args()
+    refresh_days = args.refresh_days
+    initial_posts = args.initial
+    max_posts = args.max_posts
+    output_dir = args.output_dir
+    compression = args.compress
+    crawler.more_limit = args.more_limit
+    if args.metrics or args.metrics_interval:
+        metrics.enable(interval=args.metrics_interval, path=args.metrics)
+    try:
+        if not init_reddit_sessions():
+            print("Error: No Reddit sessions available. Check your environment variables.")
+            sys.exit(1)
+        for subreddit in args.subreddits:
+            refresh_subreddit(subreddit)
+    except KeyboardInterrupt:
+        print("\n⏹  stopped by user (the next run continues from the saved marks)")
+    finally:
+        if metrics.enabled:
+            print(metrics.summary_line())
+            metrics.dump()
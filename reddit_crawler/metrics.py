@@ -0,0 +1,206 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# Counters, histograms and timers for the crawl and clean hot paths.
+#
+# Disabled by default: every entry point checks one module flag and returns, and
+# timer() hands back a shared no-op context manager, so instrumented code costs next
+# to nothing unless enable() was called (--metrics / --metrics-interval).
+#
+#   metrics.incr("posts_written_total")
+#   with metrics.timer("fetch_seconds"): ...
+#   @metrics.timed("clean_post_seconds")
+#
+# Histograms use fixed latency buckets; dump() writes JSON, or the Prometheus text
+# format when the path ends in .prom.
+
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+enabled = False
+summary_interval = None  # seconds between summary lines, None for no periodic output
+dump_path = None  # rewritten with every summary and at the end of a run
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_started = time.time()
+_last_report = time.time()
+
+
+class _Histogram:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return 0.0
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def enable(interval=None, path=None):
+    global enabled, summary_interval, dump_path, _started, _last_report
+    enabled = True
+    summary_interval = interval
+    dump_path = path
+    _started = _last_report = time.time()
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def incr(name, n=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, value):
+    if not enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _Histogram()
+        histogram.observe(value)
+
+
+def timer(name):
+    return _Timer(name) if enabled else _NULL_TIMER
+
+
+def timed(name):
+    # Decorator form of timer()
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "uptime_seconds": time.time() - _started,
+            "counters": dict(_counters),
+            "histograms": {
+                name: {"count": h.count, "sum": h.total, "max": h.max,
+                       "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                       "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], h.buckets))}
+                for name, h in _histograms.items()
+            },
+        }
+
+
+def summary_line() -> str:
+    data = snapshot()
+    parts = []
+    for name, h in sorted(data["histograms"].items()):
+        avg = h["sum"] / h["count"] if h["count"] else 0.0
+        parts.append(f"{name} n={h['count']} total={h['sum']:.1f}s avg={avg * 1000:.1f}ms p95<={h['p95'] * 1000:.0f}ms")
+    for name, value in sorted(data["counters"].items()):
+        parts.append(f"{name}={value:g}")
+    return f"[metrics {data['uptime_seconds']:.0f}s] " + " | ".join(parts)
+
+
+def to_prometheus() -> str:
+    data = snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE reddit_{name} counter")
+        lines.append(f"reddit_{name} {value}")
+    for name, h in sorted(data["histograms"].items()):
+        lines.append(f"# TYPE reddit_{name} histogram")
+        cumulative = 0
+        for bound, n in h["buckets"].items():
+            cumulative += n
+            lines.append(f'reddit_{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"reddit_{name}_sum {h['sum']}")
+        lines.append(f"reddit_{name}_count {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=None):
+    path = path or dump_path
+    if not enabled or path is None:
+        return
+    if path.endswith(".prom"):
+        text = to_prometheus()
+    else:
+        text = json.dumps(snapshot(), indent=2)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def maybe_report():
+    # Call from hot loops: prints a summary line (and refreshes the dump) every summary_interval seconds
+    global _last_report
+    if not enabled or summary_interval is None:
+        return
+    now = time.time()
+    if now - _last_report < summary_interval:
+        return
+    _last_report = now
+    print(summary_line())
+    dump()
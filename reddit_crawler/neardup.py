@@ -0,0 +1,137 @@
+import bisect
+import random
+import re
+import zlib
+from array import array
+
+# Near-duplicate detection with MinHash signatures and LSH banding.
+#
+# Exact md5 dedup misses reposts with small edits, punctuation or whitespace changes.
+# Here every post is reduced to the set of its word shingles, summarized by a MinHash
+# signature (num_perm 32-bit minimums), and the signature is split into bands. Posts
+# that share a band are candidates; a candidate whose estimated Jaccard similarity is
+# at least `threshold` is a near-duplicate. Lookups only touch the posts in matching
+# buckets, and each kept post costs one signature plus one bucket entry per band.
+
+_WORD_RE = re.compile(r"\w+")
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_DENSIFY_STEP = 0x9E3779B1  # keeps borrowed values apart from the ones they were borrowed from
+
+
+def shingles(text: str, size: int = 3):
+    # Word n-grams of the lowercased text; punctuation and whitespace do not matter.
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def choose_bands(num_perm: int, threshold: float):
+    # (bands, rows) with bands * rows == num_perm whose LSH threshold (1/b)^(1/r)
+    # is closest to the requested similarity threshold.
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1.0 / br[0]) ** (1.0 / br[1]) - threshold))
+
+
+class MinHasher:
+    # Computes signatures. Holds only the hash parameters, so it is cheap to send
+    # to cleaner worker processes.
+    #
+    # One-permutation hashing: every shingle is hashed once, the hash picks one of
+    # num_perm bins and the bin keeps its smallest value, instead of num_perm separate
+    # hash functions per shingle. Empty bins (short posts) borrow the value of the
+    # next non-empty bin, offset by the distance, so equal bins still estimate the
+    # Jaccard similarity of the shingle sets.
+
+    version = 2  # signatures of different versions are not comparable
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.version = MinHasher.version
+        self._a = rng.randrange(1, _PRIME)
+        self._b = rng.randrange(0, _PRIME)
+
+    def signature(self, text: str):
+        # array('I') of num_perm minimums, or None for text without words.
+        num_perm, a, b = self.num_perm, self._a, self._b
+        empty = _MAX_HASH + 1
+        mins = [empty] * num_perm
+        for s in shingles(text, self.shingle_size):
+            h = (a * zlib.crc32(s.encode("utf-8")) + b) % _PRIME
+            value = (h // num_perm) & _MAX_HASH
+            if value < mins[h % num_perm]:
+                mins[h % num_perm] = value
+        if empty in mins:
+            filled = [i for i in range(num_perm) if mins[i] != empty]
+            if not filled:
+                return None
+            dense = list(mins)
+            for i in range(num_perm):
+                if mins[i] == empty:
+                    j = filled[bisect.bisect(filled, i) % len(filled)]  # next non-empty bin, wrapping around
+                    dense[i] = (mins[j] + (j - i) % num_perm * _DENSIFY_STEP) & _MAX_HASH
+            mins = dense
+        return array("I", mins)
+
+
+class NearDupIndex:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size, seed)
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self._signatures = array("I")  # all kept signatures, back to back
+        self._buckets = {}  # hash of (band, band values) -> index of the first post in it
+        self.checked = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._signatures) // self.hasher.num_perm
+
+    def _similarity(self, signature, doc: int) -> float:
+        num_perm = self.hasher.num_perm
+        stored = self._signatures[doc * num_perm:(doc + 1) * num_perm]
+        return sum(x == y for x, y in zip(signature, stored)) / num_perm
+
+    def _keys(self, signature):
+        rows = self.rows
+        return [hash((band, signature[band * rows:(band + 1) * rows].tobytes())) for band in range(self.bands)]
+
+    def add(self, signature) -> bool:
+        # Returns True (and counts a drop) if `signature` is a near-duplicate of a
+        # post already in the index; otherwise indexes it and returns False.
+        self.checked += 1
+        keys = self._keys(signature)
+        seen = set()
+        for key in keys:
+            doc = self._buckets.get(key)
+            if doc is not None and doc not in seen:
+                seen.add(doc)
+                if self._similarity(signature, doc) >= self.threshold:
+                    self.dropped += 1
+                    return True
+
+        doc = len(self)
+        self._signatures.extend(signature)
+        for key in keys:
+            self._buckets.setdefault(key, doc)
+        return False
+
+    def __getstate__(self):
+        # Bucket keys come from hash(), which is salted per process, so they are
+        # rebuilt from the signatures on load (incremental cleaning persists the index)
+        state = self.__dict__.copy()
+        del state["_buckets"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._buckets = {}
+        num_perm = self.hasher.num_perm
+        for doc in range(len(self)):
+            for key in self._keys(self._signatures[doc * num_perm:(doc + 1) * num_perm]):
+                self._buckets.setdefault(key, doc)
@@ -0,0 +1,112 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+from reddit_crawler import crawler, metrics
+from reddit_crawler.dedup import DiskDigestSet
+from reddit_crawler.http_cache import ResponseCache
+from reddit_crawler.request import configured_accounts, init_reddit_sessions
+
+# Crawl several subreddits at once from one command:
+#
+#   python -m reddit_crawler.orchestrator AskReddit AITAH askscience --limit 1000
+#
+# The configured Reddit accounts are split between worker processes (one per account
+# by default) and the subreddits are dealt out to the workers round-robin. A worker
+# crawls its subreddits one after another; if it owns several accounts it runs the
+# concurrent crawler across them.
+#
+# Each subreddit writes its own shards (<subreddit>_data0.jsonl, ...), so workers never
+# collide on output files. Processed and visited submission IDs live in SQLite stores
+# shared by all workers: a post is written by whichever process claims its ID first,
+# and links another worker already crawled are not queued again.
+
+PROCESSED_DB = "shared_processed_ids.sqlite"
+VISITED_DB = "shared_visited_ids.sqlite"
+
+
+def assign(subreddits, accounts, processes=None):
+    # [(subreddits, accounts)] per worker process; every worker gets at least one of each
+    workers = min(processes or len(accounts), len(accounts), len(subreddits))
+    return [(subreddits[i::workers], accounts[i::workers]) for i in range(workers)]
+
+
+def run_worker(subreddits, accounts, options):
+    # Worker process entry point. Sessions are created here, after the fork.
+    if options["metrics_interval"]:
+        metrics.enable(interval=options["metrics_interval"])
+    cache = None
+    if options["http_cache"]:
+        cache = ResponseCache(options["http_cache"])
+    sessions = init_reddit_sessions(cache=cache, accounts=accounts)
+    crawler.output_compression = options["compress"]
+    crawler.rotate_on = options["rotate_on"]
+    processed = DiskDigestSet(os.path.join(crawler.output_dir, PROCESSED_DB), commit_every=1, shared=True)
+    visited = DiskDigestSet(os.path.join(crawler.output_dir, VISITED_DB), commit_every=1, shared=True)
+    try:
+        for subreddit in subreddits:
+            crawler.checkpoint_path = os.path.join(crawler.output_dir, f"{subreddit}.checkpoint")
+            frontier = crawler.setup_crawl(subreddit, options["limit"], priority=options["priority"],
+                                           fmt=options["format"], processed=processed, visited=visited)
+            crawler.run_crawl(frontier, sessions, concurrent=True, initial_count=0)
+    except KeyboardInterrupt:
+        print(f"\n⏹  worker for {', '.join(subreddits)} stopped")
+    finally:
+        processed.close()
+        visited.close()
+        if metrics.enabled:
+            print(metrics.summary_line())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m reddit_crawler.orchestrator")
+    parser.add_argument("subreddits", nargs="+")
+    parser.add_argument("--limit", type=int, default=1000, help="seeds per round over a subreddit's listings, as for the crawler's limit")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per account)")
+    parser.add_argument("--priority", default="shortest", choices=["shortest", "affinity", "score", "depth"])
+    parser.add_argument("--format", default="jsonl", choices=["jsonl", "json"])
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="write compressed shards")
+    parser.add_argument("--rotate-on", default="uncompressed", choices=["uncompressed", "compressed"])
+    parser.add_argument("--keep-seen", action="store_true",
+                        help="keep the shared processed/visited IDs of earlier runs instead of starting fresh")
+    parser.add_argument("--http-cache", metavar="PATH", help="response cache shared by all workers")
+    parser.add_argument("--metrics-interval", type=float, metavar="SECONDS",
+                        help="each worker prints a metrics summary line every SECONDS")
+    args = parser.parse_args(argv)
+
+    accounts = configured_accounts()
+    if not accounts:
+        print("Error: No Reddit API credentials found in environment variables.")
+        sys.exit(1)
+
+    if not args.keep_seen:
+        for db in (PROCESSED_DB, VISITED_DB):
+            DiskDigestSet(os.path.join(crawler.output_dir, db), reset=True).close()
+
+    options = {"limit": args.limit, "priority": args.priority, "format": args.format,
+               "compress": args.compress, "rotate_on": args.rotate_on,
+               "http_cache": args.http_cache, "metrics_interval": args.metrics_interval}
+    workers = []
+    for subreddits, worker_accounts in assign(args.subreddits, accounts, args.processes):
+        print(f"Worker {len(workers)}: r/{', r/'.join(subreddits)} with accounts {worker_accounts}")
+        process = multiprocessing.Process(target=run_worker, args=(subreddits, worker_accounts, options))
+        process.start()
+        workers.append(process)
+
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        # The workers got the same Ctrl-C; wait for their checkpoints
+        for process in workers:
+            process.join()
+    failed = [p for p in workers if p.exitcode]
+    if failed:
+        print(f"{len(failed)} worker(s) failed")
+        sys.exit(1)
+    print("All workers finished")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import threading
+import time
+
+# Per-account token buckets driven by the rate-limit headers Reddit sends back.
+#
+# prawcore records x-ratelimit-remaining / x-ratelimit-reset from every response and
+# exposes them as `reddit.auth.limits`. Before each request we sync the account's
+# bucket with those numbers, so the bucket refills at exactly the rate the server
+# still allows for the current window and blocks until the reset once it is spent.
+
+
+class TokenBucket:
+    def __init__(self, max_rpm: float, burst_seconds: float = 10.0):
+        self.rate = max_rpm / 60.0  # tokens per second until the server tells us otherwise
+        self.burst_seconds = burst_seconds
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.blocked_until = 0.0  # wall-clock time (Reddit reports reset as an epoch timestamp)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        # Take one token and return how long the caller must wait before using it.
+        with self._lock:
+            self._refill()
+            wait = max(0.0, self.blocked_until - time.time())
+            self.tokens -= 1
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+        # Sleep if more that 10ms to avoid little delays
+        if wait > 0.01:
+            time.sleep(wait)
+        return wait
+
+    def update(self, remaining, reset_timestamp):
+        # Adopt the budget the server reported: `remaining` requests until `reset_timestamp`.
+        if remaining is None or reset_timestamp is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._refill()
+            if remaining < 1:
+                self.blocked_until = max(self.blocked_until, reset_timestamp)
+                self.tokens = min(self.tokens, 0.0)
+                return
+            window = max(reset_timestamp - now, 1.0)
+            self.rate = remaining / window
+            self.capacity = max(1.0, min(remaining, self.rate * self.burst_seconds))
+            self.tokens = min(self.tokens, remaining)
+            # prawcore leaves `remaining` positive after a 429 without rate-limit headers,
+            # so a report never lifts a block_for() back-off that has not run out yet
+            if self.blocked_until <= now:
+                self.blocked_until = 0.0
+
+    def block_for(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(session, max_rpm: float) -> TokenBucket:
+    with _buckets_lock:
+        bucket = _buckets.get(id(session))
+        if bucket is None:
+            bucket = _buckets[id(session)] = TokenBucket(max_rpm)
+        return bucket
+
+
+def observe(session, bucket: TokenBucket):
+    # Copy the latest server-reported limits of `session` into its bucket.
+    try:
+        limits = session.auth.limits
+    except AttributeError:
+        return
+    bucket.update(limits.get("remaining"), limits.get("reset_timestamp"))
+
+
+def seconds_until_reset(session, error=None, default: float = 60.0) -> float:
+    # How long `session` has to back off after a 429: the server's retry-after or
+    # ratelimit-reset header if present, else the reset time prawcore last saw.
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header in ("retry-after", "x-ratelimit-reset"):
+        try:
+            return max(0.0, float(headers[header]))
+        except (KeyError, TypeError, ValueError):
+            pass
+    try:
+        reset = session.auth.limits.get("reset_timestamp")
+    except AttributeError:
+        reset = None
+    if reset:
+        return max(0.0, reset - time.time())
+    return default
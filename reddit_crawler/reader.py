@@ -0,0 +1,113 @@
+import json
+import mmap
+import os
+from itertools import chain
+
+from reddit_crawler.writer import open_shard
+
+try:
+    import orjson  # optional, several times faster than json.loads
+    loads = orjson.loads
+    DecodeError = orjson.JSONDecodeError
+except ImportError:
+    orjson = None
+    loads = json.loads
+    DecodeError = ValueError  # JSONDecodeError and UnicodeDecodeError
+
+# Bulk record reader for shards (.jsonl, .jsonl.gz/.zst and the legacy .json arrays).
+#
+# Uncompressed shards are memory-mapped and split into lines on raw bytes, a block
+# at a time, so there is no per-line text decoding or readline() call; every line
+# goes straight to the JSON parser. Records that do not parse (or are not JSON objects)
+# are counted in `stats["malformed"]` rather than silently dropped.
+
+BLOCK_SIZE = 8 << 20
+
+
+def _blocks(path):
+    # Raw byte blocks of the (decompressed) shard
+    if path.endswith((".gz", ".zst")):
+        with open_shard(path) as f:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    return
+                yield block
+        return
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, size, BLOCK_SIZE):
+                yield mapped[start:start + BLOCK_SIZE]
+
+
+def iter_lines(path):
+    rest = b""
+    for block in _blocks(path):
+        lines = block.split(b"\n")
+        lines[0] = rest + lines[0]
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def _strip_array(line: bytes) -> bytes:
+    # One line of the legacy array layout: "[{...}," / "{...}," / "{...}]"
+    line = line.strip()
+    if line.startswith(b"["):
+        line = line[1:]
+    if line.endswith((b",", b"]")):
+        line = line.rstrip(b",]").rstrip()
+    return line
+
+
+def iter_records(path: str, stats: dict = None):
+    # Yield every JSON object in a shard; `stats` (if given) counts "records" and "malformed".
+    if stats is None:
+        stats = {}
+    stats.setdefault("records", 0)
+    stats.setdefault("malformed", 0)
+    lines = iter_lines(path)
+    first = next(lines, None)
+    if first is None:
+        return
+    if first.lstrip().startswith(b"["):
+        # Legacy array: parse the whole document when it is complete, otherwise record by record
+        try:
+            with open_shard(path) as f:
+                records = loads(f.read())
+        except DecodeError:
+            records = None
+        if isinstance(records, list):
+            for record in records:
+                if isinstance(record, dict):
+                    stats["records"] += 1
+                    yield record
+                else:
+                    stats["malformed"] += 1
+            return
+        strip = _strip_array
+    else:
+        strip = None
+
+    for line in chain([first], lines):
+        if strip is not None:
+            line = strip(line)
+            if not line:
+                continue
+        elif not line or line.isspace():
+            continue
+        try:
+            record = loads(line)
+        except DecodeError:
+            stats["malformed"] += 1
+            continue
+        if not isinstance(record, dict):
+            stats["malformed"] += 1
+            continue
+        stats["records"] += 1
+        yield record
+
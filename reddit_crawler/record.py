@@ -0,0 +1,109 @@
+from collections import namedtuple
+from operator import attrgetter
+
+# One post, shared by the crawler and the cleaner.
+#
+# Post is a fixed-schema __slots__ record: no per-post dict, and it pickles as a plain
+# tuple of values (the cleaner ships posts between processes). Comments are structured
+# (author, body) entries instead of "author: body" strings.
+#
+# Two on-disk layouts exist and both round-trip:
+#   display  the crawler's output, "Post Title", "Post Score", ..., comments as "author: body"
+#   cleaner  reddit API names (title, selftext, author, url, ...), comments as
+#            {"author", "body"} objects; keys outside the schema are kept in `extra`
+
+Comment = namedtuple("Comment", "author body")
+
+# slot -> display key, in the crawler's output order
+_DISPLAY_KEYS = (
+    ("title", "Post Title"),
+    ("subreddit", "Subreddit"),
+    ("selftext", "Selftext"),
+    ("id", "Post ID"),
+    ("created_utc", "Post Date"),
+    ("score", "Post Score"),
+    ("permalink", "URL"),
+    ("url", "Links"),
+    ("author", "Username"),
+    ("ups", "Upvotes"),
+)
+_FIELDS = ("id", "subreddit", "title", "selftext", "author", "created_utc", "score", "ups",
+           "permalink", "url", "url_title")
+_CLEANER_KEYS = frozenset(_FIELDS + ("comments",))
+_field_values = attrgetter(*_FIELDS)
+
+
+def parse_comment(value) -> Comment:
+    # From either layout: "author: body" string or {"author", "body"} object
+    if isinstance(value, dict):
+        return Comment(value.get("author") or "n/a", value.get("body") or "")
+    author, sep, body = str(value).partition(": ")
+    return Comment(author, body) if sep else Comment("n/a", author)
+
+
+class Post:
+    __slots__ = _FIELDS + ("comments", "extra")
+
+    def __init__(self, id=None, subreddit=None, title=None, selftext=None, author=None, created_utc=None,
+                 score=None, ups=None, permalink=None, url=None, url_title=None, comments=None, extra=None):
+        self.id = id
+        self.subreddit = subreddit
+        self.title = title
+        self.selftext = selftext
+        self.author = author
+        self.created_utc = created_utc
+        self.score = score
+        self.ups = ups
+        self.permalink = permalink
+        self.url = url
+        self.url_title = url_title
+        self.comments = comments if comments is not None else []
+        self.extra = extra
+
+    def __reduce__(self):
+        return Post, _field_values(self) + (self.comments, self.extra)
+
+    def __eq__(self, other):
+        return isinstance(other, Post) and all(getattr(self, n) == getattr(other, n) for n in Post.__slots__)
+
+    def __repr__(self):
+        return f"Post(id={self.id!r}, subreddit={self.subreddit!r}, title={self.title!r})"
+
+    @classmethod
+    def from_display(cls, record: dict):
+        post = cls(**{name: record.get(key) for name, key in _DISPLAY_KEYS})
+        post.comments = [parse_comment(c) for c in record.get("Comments") or ()]
+        return post
+
+    def to_display(self) -> dict:
+        record = {key: getattr(self, name) for name, key in _DISPLAY_KEYS}
+        record["Comments"] = [f"{c.author}: {c.body}" for c in self.comments]
+        return record
+
+    @classmethod
+    def from_cleaner(cls, record: dict):
+        get = record.get
+        post = cls(get("id"), get("subreddit"), get("title"), get("selftext"), get("author"), get("created_utc"),
+                   get("score"), get("ups"), get("permalink"), get("url"), get("url_title"))
+        comments = get("comments")
+        if comments:
+            post.comments = [parse_comment(c) for c in comments]
+        if record.keys() - _CLEANER_KEYS:  # raw API posts carry many more keys
+            post.extra = {key: value for key, value in record.items() if key not in _CLEANER_KEYS}
+        return post
+
+    def to_cleaner(self) -> dict:
+        # Only fields that are set, so a raw post comes out with the keys it came in with
+        record = {name: value for name, value in zip(_FIELDS, _field_values(self)) if value is not None}
+        if self.comments:
+            record["comments"] = [{"author": c.author, "body": c.body} for c in self.comments]
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+    @classmethod
+    def from_dict(cls, record: dict):
+        # Either layout, told apart by the display layout's "Post ID" / "Post Title" keys
+        if "Post ID" in record or "Post Title" in record:
+            return cls.from_display(record)
+        return cls.from_cleaner(record)
@@ -1,19 +1,45 @@
 import os
 from dotenv import load_dotenv
-import time
+import threading
+from collections import deque
+from itertools import islice
 import praw
 from typing import List, Optional
-from prawcore.exceptions import PrawcoreException
+from prawcore.exceptions import PrawcoreException, TooManyRequests
+from reddit_crawler.ratelimit import bucket_for, observe, seconds_until_reset
+from reddit_crawler.frontier import submission_id
+from reddit_crawler import metrics
 
 load_dotenv()
 # Initialize empty globals
 _sessions = []
 _current = None
-_last_request_time = 0
+# Optional http_cache.ResponseCache shared by every session (--http-cache)
+response_cache = None
 
-def init_reddit_sessions():
+# Requests per minute per account until Reddit's rate-limit headers say otherwise
+DEFAULT_MAX_RPM = 100
+
+def configured_accounts() -> List[int]:
+    # Numbers of the accounts with complete credentials in the environment
+    # (0 is the unnumbered REDDIT_CLIENT_ID/... account), without logging in.
+    keys = ("REDDIT_CLIENT_ID", "REDDIT_CLIENT_SECRET", "REDDIT_USERNAME", "REDDIT_PASSWORD")
+    accounts = []
+    if all(os.getenv(key) for key in keys):
+        accounts.append(0)
+    i = 1
+    while any(os.getenv(f"{key}{i}") for key in keys):
+        if all(os.getenv(f"{key}{i}") for key in keys):
+            accounts.append(i)
+        i += 1
+    return accounts
+
+def init_reddit_sessions(cache=None, accounts=None):
     #Initialize Reddit API sessions from environment variables.
-    global _sessions, _current
+    # With `cache` (an http_cache.ResponseCache) every session answers repeat
+    # submission/comment fetches from disk instead of the API.
+    # `accounts` restricts this process to those account numbers (see configured_accounts).
+    global _sessions, _current, response_cache
    
     _sessions = []
    
@@ -27,6 +53,11 @@ def init_reddit_sessions():
         print("REDDIT_PASSWORD1=your_password")
    
     found_env_vars = False
+    extra = {}
+    if cache is not None:
+        from reddit_crawler.http_cache import CachingRequestor
+        extra = {"requestor_class": CachingRequestor, "requestor_kwargs": {"cache": cache}}
+        response_cache = cache
    
     # try default account
     client_id = os.getenv("REDDIT_CLIENT_ID")
@@ -34,7 +65,7 @@ def init_reddit_sessions():
     username = os.getenv("REDDIT_USERNAME")
     password = os.getenv("REDDIT_PASSWORD")
     
-    if all([client_id, client_secret, username, password]):
+    if all([client_id, client_secret, username, password]) and (accounts is None or 0 in accounts):
         found_env_vars = True
         try:
             session = praw.Reddit(
@@ -42,7 +73,8 @@ def init_reddit_sessions():
                 client_secret=client_secret,
                 username=username,
                 password=password,
-                user_agent=f"cs172:reddit_crawler:v1.0 (by /u/{username})"
+                user_agent=f"cs172:reddit_crawler:v1.0 (by /u/{username})",
+                **extra
             )
             _sessions.append(session)
             print(f"Initialized Reddit session for user {username}")
@@ -60,6 +92,10 @@ def init_reddit_sessions():
             break
            
         found_env_vars = True
+
+        if accounts is not None and i not in accounts:
+            i += 1
+            continue
        
         if not all([client_id, client_secret, username, password]):
             print(f"Warning: Incomplete credentials for account {i}. Please check your .env file.")
@@ -72,7 +108,8 @@ def init_reddit_sessions():
                 client_secret=client_secret,
                 username=username,
                 password=password,
-                user_agent=f"cs172:reddit_crawler:v1.0 (by /u/{username})"
+                user_agent=f"cs172:reddit_crawler:v1.0 (by /u/{username})",
+                **extra
             )
             _sessions.append(session)
             print(f"Initialized Reddit session {i} for user {username}")
@@ -119,105 +156,232 @@ def switch_account():
     print(f"Switched to Reddit account {next_index + 1} (user: {_current.config.username})")
     return _current
 
-def respect_rate(max_rpm: int = 180):
-    # Ensure the request rate doesn't exceed max_rpm (requests per minute).
-    global _last_request_time
-    
-    # Calculate minimum time between requests (in seconds)
-    min_interval = 60.0 / max_rpm
-    
-    # Check if we need to wait
-    current_time = time.time()
-    elapsed = current_time - _last_request_time
-    
-    if elapsed < min_interval and _last_request_time > 0:
-        sleep_time = min_interval - elapsed
-        # Sleep if more that 10ms to avoid little delays
-        if sleep_time > 0.01:
-            time.sleep(sleep_time)
-    
-    # Update the last request time
-    _last_request_time = time.time()
+def respect_rate(max_rpm: int = DEFAULT_MAX_RPM, session=None):
+    # Wait for a request token of `session` (default: the current account).
+    # Each account has its own bucket, kept in sync with the remaining requests and
+    # reset time Reddit reported, so bursts go through while budget is left.
+    if session is None:
+        session = _current
+    bucket = bucket_for(session, max_rpm)
+    observe(session, bucket)
+    wait = bucket.acquire()
+    metrics.observe("rate_limit_wait_seconds", wait)
+    return wait
+
+def back_off(session, error=None):
+    # After a 429, block `session` (default: the current account) until its window resets.
+    if session is None:
+        session = _current
+    wait = seconds_until_reset(session, error)
+    metrics.incr("http_429_total")
+    bucket_for(session, DEFAULT_MAX_RPM).block_for(wait)
+    return wait
 
-def fetch(url: str, max_rpm: int = 60) -> Optional[praw.models.Submission]:
-    # Return a PRAW Submission for `url`.
+class RateLimited(RuntimeError):
+    # fetch() gave up after every retry hit a 429; the URL is worth trying again later
+    pass
+
+def load_submission(session, url: str, comment_sort: Optional[str] = None) -> praw.models.Submission:
+    # PRAW submissions are lazy; load the page (post and first comments) right away
+    # so a 429 surfaces here, where fetch() can back off and retry it. `comment_sort`
+    # has to be set before that request, PRAW ignores it once the comments are loaded.
+    # fetch_seconds is only this request; waiting for a token is rate_limit_wait_seconds
+    submission = session.submission(url=url)
+    if comment_sort is not None:
+        submission.comment_sort = comment_sort
+    with metrics.timer("fetch_seconds"):
+        submission._fetch()
+    return submission
+
+def fetch(url: str, max_rpm: int = DEFAULT_MAX_RPM, session=None,
+          comment_sort: Optional[str] = None) -> Optional[praw.models.Submission]:
+    # Return a loaded PRAW Submission for `url`, its comments in `comment_sort` order
+    # (Reddit's default, "confidence", if None).
+    # With `session`, the request is pinned to that account (concurrent workers);
+    # otherwise the shared current account is used and rotated on 429.
     global _current
     
     if not _sessions:
         init_reddit_sessions()
+
+    # A cached submission costs no API request, so it needs no token either
+    sid = submission_id(url)
+    cached = response_cache is not None and sid is not None and response_cache.has_submission(sid)
     
-    for attempt in range(len(_sessions)):  # try for as many active sessions we have available
-        respect_rate(max_rpm)
+    if session is not None:
+        for attempt in range(3):
+            if not cached:
+                respect_rate(max_rpm, session)  # waits out any 429 back-off
+            try:
+                return load_submission(session, url, comment_sort)
+            except PrawcoreException as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status == 429:
+                    back_off(session, e)
+                    continue
+                print(f"Error fetching {url}: {e}")
+                raise
+        raise RateLimited(f"Account {session.config.username} rate-limited (429); try again later")
+    
+    for attempt in range(len(_sessions) + 1):  # every account once, plus one retry after the earliest reset
+        if not cached:
+            respect_rate(max_rpm)
         try:
-            return _current.submission(url=url)
+            return load_submission(_current, url, comment_sort)
         except PrawcoreException as e:
             status = getattr(getattr(e, "response", None), "status_code", None)
             # Switch account if too many requests
             if status == 429:
-                _current = switch_account()
+                back_off(_current, e)
+                if attempt < len(_sessions) - 1:
+                    _current = switch_account()
+                else:
+                    # All accounts hit the limit; move to the one that resets first
+                    _current = min(_sessions, key=lambda s: bucket_for(s, max_rpm).blocked_until)
                 continue 
             print(f"Error fetching {url}: {e}")
             raise
     
-    # All accounts hit the limit; last resort – wait a minute then raise
-    time.sleep(60)
-    raise RuntimeError("All accounts rate-limited (429); try again later")
+    raise RateLimited("All accounts rate-limited (429); try again later")
 
-def get_diverse_submissions(subreddit_name: str, limit: int = 1000) -> List[praw.models.Submission]:
-    # Get a diverse set of submissions using different sort methods and time filters.
-    global _current
-    
+def fetch_info(fullnames: List[str], max_rpm: int = DEFAULT_MAX_RPM) -> List[praw.models.Submission]:
+    # Current listing data (score, num_comments, ...) of many submissions through
+    # /api/info, 100 per request; far cheaper than fetch() when no comments are needed.
     if not _sessions:
         init_reddit_sessions()
-    
-    all_submissions = []
-    
-    # Use different sorting methods to maximize seed count
-    sort_methods = ["top", "hot", "new", "controversial"]
-    time_filters = ["all", "year", "month", "week", "day"]
-    
-    subreddit = _current.subreddit(subreddit_name)
+    found = []
+    for start in range(0, len(fullnames), 100):
+        chunk = fullnames[start:start + 100]
+        respect_rate(max_rpm)
+        try:
+            found.extend(_current.info(fullnames=chunk))
+        except PrawcoreException as e:
+            print(f"Error getting info for {len(chunk)} submissions: {e}")
+    return found
+
+# Use different sorting methods to maximize seed count
+SORT_METHODS = ["top", "hot", "new", "controversial"]
+TIME_FILTERS = ["all", "year", "month", "week", "day"]
+# (sort method, time filter) for every listing; don't use time filter on hot/new (time based)
+LISTINGS = [(sort_method, time_filter if sort_method in ["top", "controversial"] else None)
+            for sort_method in SORT_METHODS
+            for time_filter in (TIME_FILTERS if sort_method in ["top", "controversial"] else [None])]
+
+class SeedSource:
+    # Streams unique submissions from the sort/time-filter listings of a subreddit
+    # (all of LISTINGS by default).
+    #
+    # Listings are paged round-robin, one page at a time, so the first seeds arrive
+    # after a single request. Each listing remembers its `after` cursor and the
+    # round-robin position is kept between calls: later calls continue with the next
+    # listing and page instead of paging from the top again. A listing is exhausted by
+    # a short page; a failed request is retried on a later round.
+
+    max_failures = 3  # errors in a row before a listing is skipped for good
+
+    def __init__(self, subreddit_name: str, page_size: int = 100, listings=LISTINGS):
+        self.subreddit_name = subreddit_name
+        self.page_size = page_size
+        self.listings = [tuple(listing) for listing in listings]
+        self.cursors = {listing: None for listing in self.listings}
+        self.position = 0  # index of the listing whose page is fetched next
+        self.exhausted = set()
+        self.failures = {}  # listing -> errors in a row; a listing is only given up after max_failures
+        self.seen_ids = set()
+        self._buffer = deque()  # fetched but not handed out yet
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self.stream()
+
+    def stream(self, rounds: Optional[int] = None):
+        # Yield unique submissions; stops after `rounds` passes over the listings, or
+        # once every listing is exhausted.
+        pages = 0
+        while True:
+            while self._buffer:
+                yield self._buffer.popleft()
+            if len(self.exhausted) == len(self.listings):
+                return
+            if rounds is not None and pages >= rounds * len(self.listings):
+                return
+            listing = self.listings[self.position]
+            self.position = (self.position + 1) % len(self.listings)
+            pages += 1
+            if listing not in self.exhausted:
+                self._buffer.extend(self._next_page(listing))
+
+    def take(self, n: int) -> List[praw.models.Submission]:
+        with self._lock:
+            return list(islice(self.stream(), n))
+
+    def _next_page(self, listing):
+        sort_method, time_filter = listing
+        if not _sessions:
+            init_reddit_sessions()
+        kwargs = {"limit": self.page_size}
+        if time_filter is not None:
+            kwargs["time_filter"] = time_filter
+        if self.cursors[listing] is not None:
+            kwargs["params"] = {"after": self.cursors[listing]}
+        try:
+            respect_rate()
+            if time_filter is not None:
+                print(f"Getting {self.page_size} {sort_method} posts from time filter: {time_filter}")
+            else:
+                print(f"Getting {self.page_size} {sort_method} posts")
+            method = getattr(_current.subreddit(self.subreddit_name), sort_method)
+            page = list(method(**kwargs))
+        except TooManyRequests as e:
+            # Not the listing's fault: keep its cursor and page it again on the next round
+            print(f"Rate-limited getting {sort_method} submissions with {time_filter}, retrying later")
+            back_off(_current, e)
+            return []
+        except Exception as e:
+            # Usually transient (5xx, timeout, reset): keep the cursor and page it again on
+            # the next round, unless it keeps failing
+            failures = self.failures[listing] = self.failures.get(listing, 0) + 1
+            print(f"Error getting {sort_method} submissions with {time_filter} ({failures} in a row): {e}")
+            if failures >= self.max_failures:
+                self.exhausted.add(listing)
+            return []
+
+        self.failures.pop(listing, None)
+        if len(page) < self.page_size:
+            self.exhausted.add(listing)
+        if page:
+            self.cursors[listing] = page[-1].fullname
+        fresh = []
+        for submission in page:
+            if submission.id not in self.seen_ids:
+                self.seen_ids.add(submission.id)
+                fresh.append(submission)
+        return fresh
+
+    def state(self) -> dict:
+        # Cursors, round-robin position and seen IDs, for crawl checkpoints
+        with self._lock:
+            return {"subreddit_name": self.subreddit_name, "page_size": self.page_size, "listings": list(self.listings),
+                    "cursors": dict(self.cursors), "position": self.position, "exhausted": set(self.exhausted),
+                    "seen_ids": set(self.seen_ids)}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        source = cls(state["subreddit_name"], state["page_size"], state.get("listings", LISTINGS))
+        source.cursors.update(state["cursors"])
+        source.position = state.get("position", 0)
+        source.exhausted = set(state["exhausted"])
+        source.seen_ids = set(state["seen_ids"])
+        return source
+
+def get_diverse_submissions(subreddit_name: str, limit: int = 1000) -> List[praw.models.Submission]:
+    # Get a diverse set of submissions using different sort methods and time filters:
+    # one page from every listing.
     # Split total limit with 20 possible filters (sortmethod * time filter)
-    submissions_per_combo = max(10, limit // (len(sort_methods) * len(time_filters)))
+    submissions_per_combo = max(10, limit // (len(SORT_METHODS) * len(TIME_FILTERS)))
     
     print(f"Collecting submissions from r/{subreddit_name}...")
-    
-    for sort_method in sort_methods:
-        if sort_method in ["top", "controversial"]:
-            # These methods use time filters
-            for time_filter in time_filters:
-                try:
-                    respect_rate(180)
-                    print(f"Getting {submissions_per_combo} {sort_method} posts from time filter: {time_filter}")
-                    
-                    method = getattr(subreddit, sort_method)
-                    for submission in method(time_filter=time_filter, limit=submissions_per_combo):
-                        all_submissions.append(submission)
-                        
-                except Exception as e:
-                    print(f"Error getting {sort_method} submissions with {time_filter}: {e}")
-        else:
-            # don't use time filter on hot (time based)
-            try:
-                respect_rate(180)
-                print(f"Getting {submissions_per_combo} {sort_method} posts")
-                
-                method = getattr(subreddit, sort_method)
-                for submission in method(limit=submissions_per_combo):
-                    all_submissions.append(submission)
-                    
-            except Exception as e:
-                print(f"Error getting {sort_method} submissions: {e}")
-    
-    # Remove duplicates by ID
-    seen_ids = set()
-    unique_submissions = []
-    
-    for submission in all_submissions:
-        if submission.id not in seen_ids:
-            seen_ids.add(submission.id)
-            unique_submissions.append(submission)
-    
+    unique_submissions = list(SeedSource(subreddit_name, page_size=submissions_per_combo).stream(rounds=1))
     print(f"Retrieved {len(unique_submissions)} unique submissions from r/{subreddit_name}")
     return unique_submissions
 
@@ -0,0 +1,189 @@
+import gzip
+import io
+import json
+import os
+
+try:
+    import zstandard  # optional, only needed for compression="zstd"
+except ImportError:
+    zstandard = None
+
+# Exactly 10MB (10,485,760 bytes)
+MAX_FILE_BYTES = 10485760
+
+COMPRESSIONS = (None, "gzip", "zstd")
+_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def open_shard(path: str):
+    # Binary, line-iterable reader for a shard, decompressing .gz/.zst transparently.
+    # Shards written with compression are a series of independent frames (gzip members /
+    # zstd frames); both readers continue across frame boundaries.
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed: pip install zstandard")
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader, buffer_size=1 << 20)
+    return open(path, "rb")
+
+
+class JsonlWriter:
+    # Long-lived, buffered writer for numbered output shards (data0.jsonl, data1.jsonl, ...).
+    #
+    # The file stays open between records and the shard size is tracked in memory,
+    # so a record costs one buffered write instead of an open/flush/stat. Shards
+    # rotate once they reach `max_bytes`.
+    #
+    # fmt="jsonl" writes one record per line: every complete line is valid on its own,
+    # so a crash never corrupts what was already written and shards can be appended to.
+    # fmt="json" keeps the legacy layout of one JSON array per file.
+    #
+    # compression="gzip"/"zstd" writes data0.jsonl.gz / .jsonl.zst. Every shard is
+    # compressed on its own and flush() ends the current frame, so shards stay
+    # independently readable (and splittable at frame boundaries) and a resumed crawl
+    # appends a new frame after the last checkpoint. rotate_on chooses whether
+    # `max_bytes` limits the "uncompressed" or the "compressed" size of a shard.
+    # split_before=True rotates before a record would push a shard past the limit
+    # instead of after it has reached it.
+
+    def __init__(self, output_dir: str, name: str, index: int = 0, max_bytes: int = MAX_FILE_BYTES,
+                 fmt: str = "jsonl", buffer_size: int = 1 << 20, compression=None, level=None,
+                 rotate_on: str = "uncompressed", split_before: bool = False, ensure_ascii: bool = False):
+        if fmt not in ("jsonl", "json"):
+            raise ValueError(f"Unknown output format: {fmt}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package: pip install zstandard")
+        if rotate_on not in ("uncompressed", "compressed"):
+            raise ValueError(f"Unknown rotate_on: {rotate_on}")
+        self.output_dir = output_dir
+        self.name = name
+        self.index = index
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.buffer_size = buffer_size
+        self.compression = compression
+        self.level = level
+        self.rotate_on = rotate_on
+        self.split_before = split_before
+        self.ensure_ascii = ensure_ascii
+        self.bytes_written = 0  # uncompressed bytes in the current shard
+        self.records = 0  # records in the current shard
+        self._file = None
+        self._frame = None  # compressor writing into _file, None between frames
+
+    @property
+    def path(self) -> str:
+        ext = ".jsonl" if self.fmt == "jsonl" else ".json"
+        return os.path.join(self.output_dir, f"{self.name}{self.index}{ext}{_EXTENSIONS[self.compression]}")
+
+    @property
+    def shard_bytes(self) -> int:
+        # Size of the current shard as counted by rotate_on (compressed: bytes already
+        # produced by the compressor, at most one block behind)
+        if self.rotate_on == "compressed" and self.compression is not None:
+            return self._file.tell() if self._file is not None else 0
+        return self.bytes_written
+
+    def _open(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._file = open(self.path, "wb", buffering=self.buffer_size)
+        self.bytes_written = 0
+        self.records = 0
+
+    def _sink(self):
+        if self.compression is None:
+            return self._file
+        if self._frame is None:
+            if self.compression == "gzip":
+                level = 6 if self.level is None else self.level
+                self._frame = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=level, mtime=0)
+            else:
+                level = 3 if self.level is None else self.level
+                self._frame = zstandard.ZstdCompressor(level=level).stream_writer(self._file)
+        return self._frame
+
+    def _end_frame(self):
+        if self._frame is None:
+            return
+        if self.compression == "gzip":
+            self._frame.close()  # writes the gzip trailer, leaves _file open
+        else:
+            self._frame.flush(zstandard.FLUSH_FRAME)
+        self._frame = None
+
+    def _finish_file(self):
+        if self.fmt == "json":
+            self._sink().write(b"]")
+        self._end_frame()
+        self._file.close()
+        self._file = None
+        self.index += 1
+
+    def write(self, record) -> int:
+        # Append one record; returns the number of (uncompressed) bytes it took.
+        return self.write_encoded(json.dumps(record, ensure_ascii=self.ensure_ascii).encode("utf-8"))
+
+    def write_encoded(self, data: bytes) -> int:
+        # Append one record that is already JSON-encoded (no trailing newline).
+        if self.split_before and self.records:
+            separator = 2 if self.fmt == "json" else 1
+            if self.shard_bytes + len(data) + separator > self.max_bytes:
+                self._finish_file()
+        if self._file is None:
+            self._open()
+        if self.fmt == "json":
+            data = (b",\n" if self.records else b"[") + data
+        else:
+            data += b"\n"
+        self._sink().write(data)
+        self.bytes_written += len(data)
+        self.records += 1
+
+        if not self.split_before and self.shard_bytes >= self.max_bytes:
+            self._finish_file()
+        return len(data)
+
+    def position(self) -> dict:
+        # Where the next record goes; everything before it is on disk after flush().
+        return {"name": self.name, "index": self.index, "bytes_written": self.bytes_written,
+                "records": self.records, "fmt": self.fmt, "max_bytes": self.max_bytes,
+                "compression": self.compression, "rotate_on": self.rotate_on,
+                "file_bytes": self._file.tell() if self._file is not None else 0}
+
+    @classmethod
+    def resume(cls, output_dir: str, position: dict):
+        # Reopen the shard at `position`, dropping anything written after it.
+        writer = cls(output_dir, position["name"], index=position["index"],
+                     max_bytes=position["max_bytes"], fmt=position["fmt"],
+                     compression=position.get("compression"), rotate_on=position.get("rotate_on", "uncompressed"))
+        if position["records"]:
+            offset = position["file_bytes"] if writer.compression else position["bytes_written"]
+            writer._file = open(writer.path, "r+b", buffering=writer.buffer_size)
+            writer._file.truncate(offset)
+            writer._file.seek(offset)
+            writer.bytes_written = position["bytes_written"]
+            writer.records = position["records"]
+        return writer
+
+    def flush(self):
+        # With compression this also ends the current frame, so position() is a frame boundary
+        if self._file is not None:
+            self._end_frame()
+            self._file.flush()
+
+    def close(self):
+        # Finish the current shard. The next write starts a new one, so a closed
+        # shard is never reopened and truncated.
+        if self._file is not None:
+            self._finish_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,190 @@
+import json
+import os
+
+import pytest
+
+import cleaner
+from reddit_crawler.record import Post
+
+
+class StubInfo:
+    # Stands in for reddit.info(): fixed titles, records every batch it was asked for
+    def __init__(self, titles, fail=False):
+        self.titles = titles
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, ids):
+        self.calls.append(list(ids))
+        if self.fail:
+            return None
+        return {i: self.titles[i] for i in ids if i in self.titles}
+
+
+def link_post(n, sid=None):
+    url = f"https://www.reddit.com/r/AskReddit/comments/{sid}/title/" if sid else f"https://example.com/{n}"
+    return Post(id=f"p{n}", title=f"post {n}", url=url)
+
+
+def test_title_resolver_keeps_order_and_batches(tmp_path):
+    stub = StubInfo({"aa1": "first", "bb2": "second", "cc3": "third"})
+    resolver = cleaner.TitleResolver(str(tmp_path / "titles.sqlite"), fetch_titles=stub, batch_size=2)
+    posts = [link_post(0, "aa1"), link_post(1), link_post(2, "bb2"), link_post(3, "cc3"), link_post(4, "aa1")]
+    out = list(resolver.process(posts))
+    resolver.close()
+    assert [p.id for p in out] == ["p0", "p1", "p2", "p3", "p4"]
+    assert [p.url_title for p in out] == ["first", None, "second", "third", "first"]
+    # two batches of two IDs; aa1 is already cached when the second one is resolved
+    assert [sorted(call) for call in stub.calls] == [["aa1", "bb2"], ["cc3"]]
+
+
+def test_title_resolver_uses_cache_on_rerun(tmp_path):
+    path = str(tmp_path / "titles.sqlite")
+    stub = StubInfo({"aa1": "first"})
+    resolver = cleaner.TitleResolver(path, fetch_titles=stub)
+    list(resolver.process([link_post(0, "aa1"), link_post(1, "dd4")]))
+    resolver.close()
+    assert len(stub.calls) == 1
+
+    rerun = StubInfo({})
+    resolver = cleaner.TitleResolver(path, fetch_titles=rerun)
+    out = list(resolver.process([link_post(0, "aa1"), link_post(1, "dd4")]))
+    resolver.close()
+    assert rerun.calls == []  # hits and remembered misses both come from the cache
+    assert [p.url_title for p in out] == ["first", None]
+
+
+def test_title_resolver_does_not_cache_failures(tmp_path):
+    path = str(tmp_path / "titles.sqlite")
+    resolver = cleaner.TitleResolver(path, fetch_titles=StubInfo({}, fail=True))
+    out = list(resolver.process([link_post(0, "aa1")]))
+    resolver.close()
+    assert out[0].url_title is None
+
+    stub = StubInfo({"aa1": "first"})
+    resolver = cleaner.TitleResolver(path, fetch_titles=stub)
+    out = list(resolver.process([link_post(0, "aa1")]))
+    resolver.close()
+    assert stub.calls == [["aa1"]]
+    assert out[0].url_title == "first"
+
+
+def test_with_url_title_appends_last_key():
+    line = json.dumps({"title": "a", "url": "https://www.reddit.com/comments/aa1/"}).encode()
+    assert json.loads(cleaner.with_url_title(line, "Title é")) == \
+        {"title": "a", "url": "https://www.reddit.com/comments/aa1/", "url_title": "Title é"}
+
+
+def test_imap_bounded_keeps_order_and_window():
+    import multiprocessing.dummy
+    with multiprocessing.dummy.Pool(3) as pool:
+        results = cleaner.imap_bounded(pool, abs, range(0, -20, -1), window=4)
+        assert list(results) == list(range(20))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Points the cleaner's input, output and state files at a temporary directory
+    out = tmp_path / "cleaned_data"
+    (tmp_path / "raw_data").mkdir()
+    out.mkdir()
+    monkeypatch.setattr(cleaner, "input_dir", str(tmp_path / "raw_data"))
+    monkeypatch.setattr(cleaner, "output_dir", str(out))
+    monkeypatch.setattr(cleaner, "manifest_path", str(out / "manifest.json"))
+    monkeypatch.setattr(cleaner, "dedup_index_path", str(out / "dedup_index.sqlite"))
+    monkeypatch.setattr(cleaner, "near_dup_index_path", str(out / "near_dup_index.pickle"))
+    return tmp_path
+
+
+def write_raw(workdir, name, start, n):
+    with open(workdir / "raw_data" / name, "w", encoding="utf-8") as f:
+        for i in range(start, start + n):
+            post = {"author": f"user{i}", "title": f"question number {i}", "selftext": "body " * 100,
+                    "url": f"https://www.reddit.com/r/AskReddit/comments/s{i}/t/"}
+            f.write(json.dumps(post) + "\n")
+
+
+def cleaned_titles(workdir):
+    out = workdir / "cleaned_data"
+    titles = []
+    for name in sorted(os.listdir(out)):
+        if name.startswith("cleaned_data_"):
+            titles += [json.loads(line)["title"] for line in open(out / name, encoding="utf-8")]
+    return titles
+
+
+def test_incremental_run_cut_by_target_loses_nothing(workdir, monkeypatch):
+    write_raw(workdir, "a.jsonl", 0, 300)
+    write_raw(workdir, "b.jsonl", 300, 300)
+    resolver = lambda: cleaner.TitleResolver(str(workdir / "titles.sqlite"), fetch_titles=StubInfo({"s1": "one"}))
+    monkeypatch.setattr(cleaner, "target_total_mb", 0.2)
+    cleaner.clean_all_files(resolver(), incremental=True)
+    first = cleaned_titles(workdir)
+    assert 0 < len(first) < 600
+
+    monkeypatch.setattr(cleaner, "target_total_mb", 500)
+    cleaner.clean_all_files(resolver(), incremental=True)
+    titles = cleaned_titles(workdir)
+    assert sorted(titles) == sorted(f"question number {i}" for i in range(600))
+
+    cleaner.clean_all_files(resolver(), incremental=True)  # nothing new
+    assert len(cleaned_titles(workdir)) == 600
+
+
+def test_parallel_run_matches_serial(workdir):
+    write_raw(workdir, "a.jsonl", 0, 50)
+    write_raw(workdir, "b.jsonl", 25, 50)  # overlaps a.jsonl
+    outputs = []
+    for workers in (1, 2):
+        cleaner.clean_all_files(cleaner.TitleResolver(str(workdir / "titles.sqlite"), fetch_titles=StubInfo({})),
+                                workers=workers)
+        outputs.append(open(workdir / "cleaned_data" / "cleaned_data_0.jsonl", "rb").read())
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count(b"\n") == 75
+
+
+def test_incremental_run_after_a_full_run_only_adds_new_files(workdir):
+    write_raw(workdir, "a.jsonl", 0, 100)
+    resolver = lambda: cleaner.TitleResolver(str(workdir / "titles.sqlite"), fetch_titles=StubInfo({}))
+    cleaner.clean_all_files(resolver())
+    first_shard = (workdir / "cleaned_data" / "cleaned_data_0.jsonl").read_bytes()
+    write_raw(workdir, "b.jsonl", 50, 100)  # half of it repeats a.jsonl
+    cleaner.clean_all_files(resolver(), incremental=True)
+    assert cleaner.load_manifest()["files"].keys() == {"a.jsonl", "b.jsonl"}
+    assert (workdir / "cleaned_data" / "cleaned_data_0.jsonl").read_bytes() == first_shard  # appended, not redone
+    assert sorted(cleaned_titles(workdir)) == sorted(f"question number {i}" for i in range(150))
+
+
+def test_manifest_is_not_saved_before_the_hashes(workdir, monkeypatch):
+    write_raw(workdir, "a.jsonl", 0, 20)
+    resolver = lambda: cleaner.TitleResolver(str(workdir / "titles.sqlite"), fetch_titles=StubInfo({}))
+    commit = cleaner.DiskDigestSet.commit
+
+    def crash(self):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cleaner.DiskDigestSet, "commit", crash)
+    with pytest.raises(OSError):
+        cleaner.clean_all_files(resolver(), incremental=True)
+    monkeypatch.setattr(cleaner.DiskDigestSet, "commit", commit)
+    write_raw(workdir, "b.jsonl", 10, 20)  # overlaps a.jsonl
+    cleaner.clean_all_files(resolver(), incremental=True)
+    titles = cleaned_titles(workdir)
+    assert sorted(titles) == sorted(f"question number {i}" for i in range(30))
+
+
+def test_hashes_of_a_run_without_manifest_are_dropped(workdir, monkeypatch):
+    write_raw(workdir, "a.jsonl", 0, 20)
+    resolver = lambda: cleaner.TitleResolver(str(workdir / "titles.sqlite"), fetch_titles=StubInfo({}))
+
+    def crash(manifest, path=None):
+        raise OSError("disk full")
+
+    save_manifest = cleaner.save_manifest
+    # the hashes were committed, then the run died before saving the manifest
+    monkeypatch.setattr(cleaner, "save_manifest", crash)
+    with pytest.raises(OSError):
+        cleaner.clean_all_files(resolver(), incremental=True)
+    monkeypatch.setattr(cleaner, "save_manifest", save_manifest)
+    cleaner.clean_all_files(resolver(), incremental=True)
+    assert sorted(cleaned_titles(workdir)) == sorted(f"question number {i}" for i in range(20))
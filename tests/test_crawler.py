@@ -0,0 +1,64 @@
+import pytest
+
+from reddit_crawler import crawler, metrics
+
+
+class FakeMore:
+    def __init__(self, count):
+        self.count = count
+
+
+class FakeComment:
+    author = None
+
+    def __init__(self, body):
+        self.body = body
+
+
+class FakeForest:
+    def __init__(self, items):
+        self.items = items
+        self.expanded = None
+
+    def list(self):
+        return self.items
+
+    def replace_more(self, limit):
+        self.expanded = limit
+
+
+class FakeSubmission:
+    selftext = ""
+
+    def __init__(self, items):
+        self.comments = FakeForest(items)
+
+
+@pytest.fixture
+def counters():
+    metrics.enable()
+    metrics.reset()
+    yield lambda: metrics.snapshot()["counters"]
+    metrics.reset()
+    metrics.enabled = False
+
+
+def test_saved_requests_ignore_empty_more_comments(counters, monkeypatch):
+    monkeypatch.setattr(crawler, "more_limit", 10)
+    monkeypatch.setattr(crawler, "comment_limit", 100)
+    items = [FakeComment(f"c{i}") for i in range(30)] + [FakeMore(200), FakeMore(0), FakeMore(0)]
+    response = FakeSubmission(items)
+    comments, _, stats = crawler.expand_thread(response)
+    assert response.comments.expanded == stats["requests"] == 1
+    assert len(comments) == 30
+    # only one MoreComments had anything to load, so a fixed budget would also have spent one
+    assert counters()["more_requests_saved_total"] == 0
+
+
+def test_saved_requests_capped_by_more_limit(counters, monkeypatch):
+    monkeypatch.setattr(crawler, "more_limit", 3)
+    monkeypatch.setattr(crawler, "comment_limit", 100)
+    items = [FakeComment(f"c{i}") for i in range(95)] + [FakeMore(50) for _ in range(8)]
+    _, _, stats = crawler.expand_thread(FakeSubmission(items))
+    assert stats["requests"] == 1
+    assert counters()["more_requests_saved_total"] == 2
@@ -0,0 +1,90 @@
+import hashlib
+import pickle
+
+import pytest
+
+from reddit_crawler.dedup import BACKENDS, BloomFilter, CompactDigestSet, DiskDigestSet, make_store
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    store = make_store(request.param, path=str(tmp_path / "seen.sqlite"), capacity=16)
+    yield store
+    if hasattr(store, "close"):
+        store.close()
+
+
+def test_store_behaves_like_a_set(store):
+    keys = [f"id{i}" for i in range(500)] + [hashlib.md5(b"post").digest()]
+    for key in keys:
+        store.add(key)
+    assert all(key in store for key in keys)
+    assert "never-added" not in store
+    assert hashlib.md5(b"other").digest() not in store
+
+
+def test_compact_set_grows_and_counts_new_keys():
+    store = CompactDigestSet(capacity=4)
+    assert store.add("a") and not store.add("a")
+    digests = [hashlib.md5(str(i).encode()).digest() for i in range(1000)]
+    for d in digests:
+        store.add(d)
+    assert len(store) == 1001
+    assert all(d in store for d in digests)
+
+
+def test_bloom_false_positive_rate():
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    for i in range(10_000):
+        bloom.add(f"in{i}")
+    false_positives = sum(f"out{i}" in bloom for i in range(10_000))
+    assert false_positives < 300
+
+
+def test_disk_set_is_shared_and_pickles_as_reference(tmp_path):
+    path = str(tmp_path / "seen.sqlite")
+    first = DiskDigestSet(path, commit_every=1)
+    second = DiskDigestSet(path, commit_every=1)
+    assert first.add("abc123")
+    assert not second.add("abc123")  # claimed by the other handle
+    copy = pickle.loads(pickle.dumps(first))
+    assert "abc123" in copy
+    for store in (first, second, copy):
+        store.close()
+
+
+def test_disk_set_rollback_forgets_uncommitted(tmp_path):
+    store = DiskDigestSet(str(tmp_path / "seen.sqlite"), commit_every=10**9)
+    store.add("kept")
+    store.commit()
+    store.add("dropped")
+    store.rollback()
+    assert "kept" in store and "dropped" not in store
+    store.close()
+
+
+def test_disk_set_rolls_back_to_the_checkpoint_on_request(tmp_path):
+    store = DiskDigestSet(str(tmp_path / "seen.sqlite"), commit_every=1)
+    store.add("before")
+    snapshot = pickle.dumps(store)
+    store.add("after")  # committed right away, but not covered by the snapshot
+    store.close()
+    resumed = pickle.loads(snapshot)
+    assert "after" in resumed  # loading a checkpoint alone changes nothing
+    assert resumed.rollback_to_checkpoint() == 1
+    assert "before" in resumed and "after" not in resumed
+    assert resumed.add("after")
+    resumed.close()
+
+
+def test_shared_disk_set_is_never_rolled_back(tmp_path):
+    store = DiskDigestSet(str(tmp_path / "seen.sqlite"), commit_every=1, shared=True)
+    snapshot = pickle.dumps(store)
+    other = DiskDigestSet(str(tmp_path / "seen.sqlite"), commit_every=1)
+    other.add("claimed by another worker")
+    resumed = pickle.loads(snapshot)
+    with pytest.raises(ValueError):
+        resumed.rollback_to_checkpoint()
+    assert "claimed by another worker" in resumed
+    for s in (store, other, resumed):
+        s.close()
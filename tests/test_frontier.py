@@ -0,0 +1,59 @@
+from reddit_crawler.frontier import Frontier, make_priority, submission_id
+
+
+def test_submission_id_aliases():
+    assert submission_id("https://www.reddit.com/r/AskReddit/comments/AbC123/some_title/") == "abc123"
+    assert submission_id("https://old.reddit.com/comments/abc123") == "abc123"
+    assert submission_id("https://redd.it/abc123") == "abc123"
+    assert submission_id("https://www.reddit.com/r/AskReddit/") is None
+
+
+def test_shortest_url_pops_shortest_first():
+    frontier = Frontier()
+    long_url = "https://www.reddit.com/r/AskReddit/comments/aaa111/a_very_long_title_for_this_post/"
+    short_url = "https://www.reddit.com/r/AskReddit/comments/bbb222/x/"
+    frontier.push(long_url)
+    frontier.push(short_url)
+    assert frontier.pop() == (short_url, 0)
+    assert frontier.pop() == (long_url, 0)
+
+
+def test_affinity_prefers_home_then_shortest():
+    frontier = Frontier(priority=make_priority("affinity", home="AskReddit"))
+    other = "https://www.reddit.com/r/pics/comments/ccc333/x/"
+    home_long = "https://www.reddit.com/r/AskReddit/comments/aaa111/long_title_here/"
+    home_short = "https://www.reddit.com/r/AskReddit/comments/bbb222/t/"
+    for url in (other, home_long, home_short):
+        frontier.push(url)
+    assert [frontier.pop()[0] for _ in range(3)] == [home_short, home_long, other]
+
+
+def test_aliases_are_queued_once():
+    frontier = Frontier()
+    assert frontier.push("https://www.reddit.com/r/AskReddit/comments/abc123/title/")
+    assert not frontier.push("https://redd.it/abc123")
+    frontier.pop()
+    assert not frontier.push("https://old.reddit.com/comments/abc123")
+    assert "https://redd.it/abc123" in frontier
+
+
+def test_snapshot_requeues_in_flight():
+    frontier = Frontier()
+    frontier.push("https://www.reddit.com/r/AskReddit/comments/abc123/title/")
+    frontier.push("https://www.reddit.com/r/AskReddit/comments/def456/longer_title/")
+    url, _ = frontier.pop()
+    restored = Frontier.restore(frontier.snapshot())
+    assert len(restored) == 2
+    assert restored.pop()[0] == url
+
+
+def test_requeue_puts_popped_url_back():
+    frontier = Frontier()
+    frontier.push("https://www.reddit.com/r/AskReddit/comments/abc123/title/")
+    url, _ = frontier.pop()
+    assert not frontier
+    frontier.requeue(url)
+    assert frontier.pop()[0] == url
+    frontier.done(url)
+    frontier.requeue(url)  # no longer in flight
+    assert not frontier
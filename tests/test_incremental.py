@@ -0,0 +1,130 @@
+from types import SimpleNamespace
+
+import pytest
+
+from reddit_crawler import crawler, incremental, request
+
+
+@pytest.fixture
+def listing(monkeypatch):
+    # r/test/new, newest first; tests append submissions to it
+    posts = []
+
+    class FakeSeedSource:
+        def __init__(self, subreddit_name, page_size=100, listings=None):
+            pass
+
+        def stream(self):
+            yield from reversed(posts)
+
+    monkeypatch.setattr(incremental, "SeedSource", FakeSeedSource)
+    return posts
+
+
+def post(n):
+    return SimpleNamespace(id=f"p{n}", created_utc=1_600_000_000 + n)
+
+
+def store(state, submissions):
+    for submission in submissions:
+        state["high_water"], state["high_water_ids"] = incremental.advance(
+            state["high_water"], state["high_water_ids"], submission.created_utc, submission.id)
+
+
+def test_first_run_takes_the_newest(listing):
+    listing.extend(post(n) for n in range(10))
+    state = {"subreddit": "test", "high_water": None, "high_water_ids": [], "threads": {}}
+    assert [s.id for s in incremental.new_submissions(state, 3)] == ["p7", "p8", "p9"]
+
+
+def test_backlog_over_the_limit_is_kept_for_the_next_run(listing):
+    listing.extend(post(n) for n in range(3))
+    state = {"subreddit": "test", "high_water": None, "high_water_ids": [], "threads": {}}
+    store(state, listing)
+    listing.extend(post(n) for n in range(3, 10))
+
+    first = incremental.new_submissions(state, 4)
+    assert [s.id for s in first] == ["p3", "p4", "p5", "p6"]
+    store(state, first)
+    second = incremental.new_submissions(state, 4)
+    assert [s.id for s in second] == ["p7", "p8", "p9"]
+    store(state, second)
+    assert incremental.new_submissions(state, 4) == []
+
+
+def test_gap_past_the_listing_is_reported(listing, capsys):
+    state = {"subreddit": "test", "high_water": 1_599_000_000, "high_water_ids": ["old"], "threads": {}}
+    listing.extend(post(n) for n in range(5))
+    assert [s.id for s in incremental.new_submissions(state, 10)] == ["p0", "p1", "p2", "p3", "p4"]
+    assert "missing" in capsys.readouterr().out
+
+
+class FakeComment:
+    author = None
+    parent_id = None
+    score = 1
+
+    def __init__(self, n):
+        self.id = f"c{n}"
+        self.created_utc = 1_600_000_000 + n
+        self.body = f"comment {n}"
+
+
+class FakeMore:
+    def __init__(self, hidden):
+        self.hidden = hidden
+        self.count = len(hidden)
+
+
+class FakeForest:
+    # Loaded comments, newest first, and one MoreComments at the end hiding older ones
+    def __init__(self, loaded, hidden):
+        self.items = loaded + [FakeMore(hidden)]
+
+    def list(self):
+        return self.items
+
+    def replace_more(self, limit):
+        expanded = []
+        for item in self.items:
+            if isinstance(item, FakeMore):
+                if limit > 0:
+                    expanded += item.hidden
+                    limit -= 1
+                    continue
+            expanded.append(item)
+        self.items = expanded
+
+
+def test_load_submission_sorts_before_the_request():
+    sorts = []
+
+    class Submission:
+        comment_sort = "confidence"
+
+        def _fetch(self):
+            sorts.append(self.comment_sort)
+
+    session = SimpleNamespace(submission=lambda url: Submission())
+    request.load_submission(session, "https://www.reddit.com/r/test/comments/abc/x/", comment_sort="new")
+    assert sorts == ["new"]
+
+
+def test_new_comments_behind_more_comments_are_not_skipped(monkeypatch):
+    monkeypatch.setattr(crawler, "comment_limit", 3)
+    written = []
+    output = SimpleNamespace(write=lambda kind, created, record: written.append(record["Comment ID"]))
+    state = {"threads": {"t": {"created_utc": 0, "num_comments": 5, "mark": 1_600_000_000 + 4,
+                               "mark_ids": ["c4"]}}}
+    # c5..c9 are new; c5..c7 only come back once the MoreComments is expanded
+    pages = [FakeForest([FakeComment(9), FakeComment(8)], [FakeComment(n) for n in (7, 6, 5, 3)]),
+             FakeForest([FakeComment(9), FakeComment(8)], [FakeComment(n) for n in (7, 6, 5, 3)])]
+    monkeypatch.setattr(incremental, "load_thread", lambda submission: SimpleNamespace(comments=pages.pop(0)))
+    submission = SimpleNamespace(id="t", num_comments=10)
+
+    assert incremental.refresh_thread(state, output, submission) == 3
+    assert written == ["c5", "c6", "c7"]
+    assert state["threads"]["t"]["num_comments"] < submission.num_comments  # still counts as changed
+    incremental.refresh_thread(state, output, submission)
+    assert written == ["c5", "c6", "c7", "c8", "c9"]
+    assert state["threads"]["t"]["mark_ids"] == ["c9"]
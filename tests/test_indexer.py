@@ -0,0 +1,145 @@
+import json
+import math
+import random
+
+import pytest
+
+import indexer
+from indexer import BLOCK_SIZE, Index, Postings, encode_postings, post_fields, tokenize
+
+SUBREDDITS = ["AskReddit", "askscience", "books"]
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    rng = random.Random(3)
+    vocab = [f"w{i}" for i in range(60)]
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    source = tmp_path_factory.mktemp("cleaned")
+    posts = []
+    for shard in range(3):
+        with open(source / f"cleaned_data_{shard}.jsonl", "w", encoding="utf-8") as f:
+            for _ in range(400):
+                words = rng.choices(vocab, weights, k=rng.randint(1, 40))
+                post = {"id": f"p{len(posts)}", "subreddit": rng.choice(SUBREDDITS), "title": " ".join(words[:5]),
+                        "selftext": " ".join(words[5:]),
+                        # every minute once, but not in file order
+                        "created_utc": 1_600_000_000 + len(posts) * 7919 % 1200 * 60}
+                posts.append(post)
+                f.write(json.dumps(post) + "\n")
+    return str(source), posts
+
+
+def brute_force(posts, query, subreddit=None, after=None, before=None, require_all=False):
+    # BM25 over every post, the way the index scores them; {created_utc: score}
+    docs = [(post_fields(post), tokenize(post_fields(post)[2])) for post in posts]
+    avg_len = sum(len(tokens) for _, tokens in docs) / len(docs)
+    terms = list(dict.fromkeys(tokenize(query)))
+    idf = {}
+    for term in terms:
+        df = sum(term in tokens for _, tokens in docs)
+        idf[term] = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+    scores = {}
+    for (name, created, _), tokens in docs:
+        if subreddit and name != subreddit:
+            continue
+        if (after is not None and created < after) or (before is not None and created >= before):
+            continue
+        matched = [term for term in terms if term in tokens]
+        if not matched or (require_all and len(matched) < len(terms)):
+            continue
+        scores[created] = sum(idf[term] * indexer.impact(tokens.count(term), len(tokens), avg_len)
+                              for term in matched)
+    return scores
+
+
+QUERIES = [("w0", {}), ("w1 w5", {}), ("w2 w30 w59", {}), ("w0 w1", {"require_all": True}),
+           ("w3 w4", {"subreddit": "askscience"}), ("w0", {"after": 1_600_000_000 + 500 * 60}),
+           ("w7 w0", {"before": 1_600_000_000 + 100 * 60, "subreddit": "books"}), ("nothing", {}),
+           # narrow enough to score the posts in the range directly
+           ("w1 w2", {"after": 1_600_000_000 + 300 * 60, "before": 1_600_000_000 + 340 * 60}),
+           ("w0 w3", {"after": 1_600_000_000 + 600 * 60, "before": 1_600_000_000 + 610 * 60, "require_all": True})]
+
+
+def check(index, posts, k=10):
+    for query, options in QUERIES:
+        hits = index.search(query, k=k, **options)
+        expected = brute_force(posts, query, **options)
+        ranked = sorted(expected.values(), reverse=True)[:k]
+        assert [hit.score for hit in hits] == pytest.approx(ranked)
+        for hit in hits:
+            assert hit.score == pytest.approx(expected[hit.created])
+
+
+def test_postings_round_trip():
+    rng = random.Random(1)
+    docs = sorted(rng.sample(range(100_000), 3 * BLOCK_SIZE + 5))
+    tfs = [rng.choice([1, 2, 127, 128, 300]) for _ in docs]
+    lengths = [rng.randint(1, 500) for _ in range(100_000)]
+    postings = Postings(encode_postings(docs, tfs, lengths, 50.0), len(docs))
+    assert len(postings.blocks) == 4
+    assert postings.all() == (docs, tfs)
+    found = postings.between(docs[200], docs[210])
+    assert all(found[doc] == tf for doc, tf in zip(docs[200:211], tfs[200:211]))
+    for i, block in enumerate(postings.blocks):
+        block_docs, block_tfs = postings.block(i)
+        assert max(indexer.impact(tf, lengths[doc], 50.0) for doc, tf in zip(block_docs, block_tfs)) <= block[2]
+
+
+def test_single_byte_blocks_decode_like_varints():
+    docs = list(range(5, 5 + 2 * BLOCK_SIZE, 2))
+    tfs = [1 + i % 100 for i in range(len(docs))]
+    postings = Postings(encode_postings(docs, tfs, [10] * 1000, 10.0), len(docs))
+    assert postings.all() == (docs, tfs)
+
+
+def test_search_matches_brute_force(corpus, tmp_path):
+    source, posts = corpus
+    index = Index(str(tmp_path / "index"))
+    index.build(source, docs_per_segment=300)
+    assert len(index.meta["segments"]) == 4
+    check(index, posts)
+    check(index, posts, k=1)
+
+
+def test_merge_keeps_results(corpus, tmp_path):
+    source, posts = corpus
+    index = Index(str(tmp_path / "index"))
+    index.build(source, docs_per_segment=250)
+    before = [index.search(query, **options) for query, options in QUERIES]
+    index.merge(1)
+    assert len(index.meta["segments"]) == 1
+    after = [index.search(query, **options) for query, options in QUERIES]
+    for merged, separate in zip(after, before):
+        # equal scores may come back in another order
+        assert [hit.score for hit in merged] == pytest.approx([hit.score for hit in separate])
+        assert sorted(hit.created for hit in merged) == sorted(hit.created for hit in separate)
+    check(index, posts)
+
+
+@pytest.mark.parametrize("k", [5, 200])  # walks the date order / scans the subreddit's postings
+@pytest.mark.parametrize("options", [{}, {"subreddit": "books"}, {"after": 1_600_000_000 + 100 * 60},
+                                     {"subreddit": "askscience", "before": 1_600_000_000 + 900 * 60}])
+def test_empty_query_lists_newest(corpus, tmp_path, k, options):
+    source, posts = corpus
+    index = Index(str(tmp_path / "index"))
+    index.build(source, docs_per_segment=500)
+    hits = index.search("", k=k, **options)
+    newest = sorted((p["created_utc"] for p in posts
+                     if p["subreddit"] == options.get("subreddit", p["subreddit"])
+                     and p["created_utc"] >= options.get("after", 0)
+                     and p["created_utc"] < options.get("before", float("inf"))), reverse=True)[:k]
+    assert [hit.created for hit in hits] == newest
+
+
+def test_old_format_is_rebuilt(corpus, tmp_path):
+    source, posts = corpus
+    index = Index(str(tmp_path / "index"))
+    index.build(source)
+    del index.meta["version"]
+    index._save()
+    index = Index(str(tmp_path / "index"))
+    with pytest.raises(RuntimeError):
+        index.search("w0")
+    assert index.build(source) == len(posts)
+    check(index, posts)
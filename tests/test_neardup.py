@@ -0,0 +1,33 @@
+import pickle
+
+from reddit_crawler.neardup import MinHasher, NearDupIndex
+
+POST = ("what is the best advice you have ever gotten from a complete stranger "
+        "on the internet that actually changed the way you live your life today")
+
+
+def test_signature_shape_and_empty_text():
+    hasher = MinHasher(num_perm=64)
+    assert len(hasher.signature(POST)) == 64
+    assert len(hasher.signature("two words")) == 64  # fewer shingles than bins
+    assert hasher.signature("   ...  ") is None
+
+
+def test_similar_posts_estimate_jaccard():
+    hasher = MinHasher()
+    a = hasher.signature(POST)
+    assert a == hasher.signature(POST.upper() + "!!")  # same shingles
+    b = hasher.signature(POST.replace("changed", "improved"))
+    c = hasher.signature("why do cats knock things off tables when they are bored at night")
+    assert sum(x == y for x, y in zip(a, b)) > sum(x == y for x, y in zip(a, c))
+
+
+def test_index_drops_near_duplicates_and_survives_pickling():
+    index = NearDupIndex(threshold=0.5)
+    sign = index.hasher.signature
+    assert not index.add(sign(POST))
+    assert index.add(sign(POST + " ok"))
+    assert not index.add(sign("why do cats knock things off tables when they are bored at night"))
+    restored = pickle.loads(pickle.dumps(index))
+    assert restored.add(sign(POST.replace("today", "now")))
+    assert (index.checked, index.dropped, len(index)) == (3, 1, 2)
@@ -0,0 +1,92 @@
+import time
+from collections import Counter
+
+import pytest
+
+from benchmarks.fake_reddit import FakeReddit, FakeSubreddit
+from reddit_crawler import ratelimit, request
+from reddit_crawler.request import LISTINGS, SeedSource
+
+
+@pytest.fixture
+def fake_reddit(monkeypatch):
+    reddit = FakeReddit(universe=5000)
+    monkeypatch.setattr(request, "_sessions", [reddit])
+    monkeypatch.setattr(request, "_current", reddit)
+    return reddit
+
+
+def test_seed_source_refills_continue_round_robin(fake_reddit, monkeypatch):
+    pages = Counter()
+    next_page = SeedSource._next_page
+    monkeypatch.setattr(SeedSource, "_next_page", lambda self, listing: pages.update([listing]) or
+                        next_page(self, listing))
+    source = SeedSource("AskReddit", page_size=71)
+    seeds = source.take(71)
+    for _ in range(5):
+        seeds += source.take(500)
+    assert len({s.id for s in seeds}) == len(seeds)
+    assert max(pages.values()) - min(pages[listing] for listing in LISTINGS) <= 1
+
+
+def test_seed_source_state_round_trip(fake_reddit):
+    source = SeedSource("AskReddit", page_size=50)
+    first = source.take(120)
+    restored = SeedSource.from_state(source.state())
+    assert restored.position == source.position != 0
+    rest = restored.take(200)
+    assert not {s.id for s in first} & {s.id for s in rest}
+    assert restored.cursors != {listing: None for listing in LISTINGS}
+
+
+def test_seed_source_rounds(fake_reddit):
+    source = SeedSource("AskReddit", page_size=10)
+    seeds = list(source.stream(rounds=1))
+    assert fake_reddit.requests == len(LISTINGS)
+    assert source.position == 0
+    assert 10 <= len(seeds) <= 10 * len(LISTINGS)
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_back_off_survives_the_next_limits_report(fake_reddit, monkeypatch):
+    # prawcore still reports requests left after a 429 without rate-limit headers
+    fake_reddit.auth = type("Auth", (), {"limits": {"remaining": 500, "reset_timestamp": time.time() + 300}})()
+    monkeypatch.setattr(ratelimit, "_buckets", {})  # the blocked bucket must not outlive the test
+    waits = []
+    monkeypatch.setattr(ratelimit.time, "sleep", waits.append)
+    error = type("Error", (), {"response": FakeResponse({"retry-after": "30"})})()
+    request.back_off(fake_reddit, error)
+    assert request.respect_rate(100, fake_reddit) >= 29
+    assert waits and waits[0] >= 29
+
+
+def test_seed_source_retries_a_listing_after_an_error(fake_reddit, monkeypatch):
+    errors = []
+    listing = FakeSubreddit._listing
+
+    def flaky(self, order, limit, params=None):
+        if not errors:
+            errors.append(order)
+            raise RuntimeError("503 Service Unavailable")
+        return listing(self, order, limit, params)
+
+    monkeypatch.setattr(FakeSubreddit, "_listing", flaky)
+    source = SeedSource("AskReddit", page_size=10, listings=[("new", None)])
+    seeds = list(source.stream(rounds=2))
+    assert errors == [("new", None)]
+    assert len(seeds) == 10
+    assert not source.state()["exhausted"]  # a resumed crawl still pages it
+
+
+def test_seed_source_gives_up_on_a_listing_that_keeps_failing(fake_reddit, monkeypatch):
+    def broken(self, order, limit, params=None):
+        raise RuntimeError("403 Forbidden")
+
+    monkeypatch.setattr(FakeSubreddit, "_listing", broken)
+    source = SeedSource("AskReddit", page_size=10, listings=[("new", None)])
+    assert list(source.stream()) == []
+    assert source.exhausted == {("new", None)}
@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from reddit_crawler.reader import iter_records
+from reddit_crawler.writer import JsonlWriter, open_shard
+
+def records(n, start=0):
+    return [{"id": f"p{i}", "body": "x" * 40} for i in range(start, start + n)]
+
+
+def read_all(path):
+    with open_shard(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_rotation_and_read_back(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    writer = JsonlWriter(str(tmp_path), "data", max_bytes=500, compression=compression)
+    written = records(30)
+    for record in written:
+        writer.write(record)
+    writer.close()
+    shards = sorted(os.listdir(tmp_path), key=lambda f: int(f[4:].split(".")[0]))
+    assert len(shards) > 1
+    assert sum((read_all(str(tmp_path / shard)) for shard in shards), []) == written
+
+
+def test_split_before_keeps_shards_under_the_limit(tmp_path):
+    writer = JsonlWriter(str(tmp_path), "out_", max_bytes=300, split_before=True)
+    for record in records(20):
+        writer.write(record)
+    writer.close()
+    assert all(os.path.getsize(tmp_path / f) <= 300 for f in os.listdir(tmp_path))
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_resume_truncates_to_the_checkpoint(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    writer = JsonlWriter(str(tmp_path), "data", compression=compression)
+    for record in records(5):
+        writer.write(record)
+    writer.flush()
+    position = writer.position()
+    for record in records(5, start=100):  # lost in the "crash"
+        writer.write(record)
+    writer.flush()
+    writer._file.close()
+
+    resumed = JsonlWriter.resume(str(tmp_path), position)
+    path = resumed.path
+    for record in records(3, start=5):
+        resumed.write(record)
+    resumed.close()
+    assert read_all(path) == records(8)
+
+
+def test_gzip_flush_ends_a_member(tmp_path):
+    writer = JsonlWriter(str(tmp_path), "data", compression="gzip")
+    writer.write({"a": 1})
+    writer.flush()
+    boundary = writer.position()["file_bytes"]
+    writer.write({"a": 2})
+    writer.close()
+    with open(tmp_path / "data0.jsonl.gz", "rb") as f:
+        data = f.read()
+    assert gzip.decompress(data[:boundary]) == b'{"a": 1}\n'  # first member stands alone
+    assert gzip.decompress(data[boundary:]) == b'{"a": 2}\n'
+
+
+def test_reader_counts_malformed_records(tmp_path):
+    path = tmp_path / "raw.jsonl"
+    path.write_bytes(b'{"a": 1}\nnot json\n[1, 2]\n{"a": 2}')
+    stats = {}
+    assert list(iter_records(str(path), stats)) == [{"a": 1}, {"a": 2}]
+    assert stats["malformed"] == 2
+
+
+def test_legacy_json_array_layout(tmp_path):
+    writer = JsonlWriter(str(tmp_path), "data", fmt="json")
+    for record in records(3):
+        writer.write(record)
+    writer.close()
+    with open(tmp_path / "data0.json") as f:
+        assert json.load(f) == records(3)
+    assert list(iter_records(str(tmp_path / "data0.json"))) == records(3)